@@ -0,0 +1,21 @@
+import create_tables
+from shop_db import connect
+
+# Shared by the bench scripts, not a bench itself.
+
+
+def create_db(db_path, client):
+    """Creates every table for `client` in a new database, the way create_tables.py does, and returns its connection."""
+    conn = connect(db_path)
+    create_tables.conn = conn
+    create_tables.cursor = conn.cursor()
+    create_tables.create_orders_table(client)
+    create_tables.create_customers_table(client)
+    create_tables.create_line_items_table(client)
+    create_tables.create_klaviyo_campaigns(client)
+    create_tables.create_google_analytics(client)
+    create_tables.create_sync_state(client)
+    create_tables.create_quarantine(client)
+    create_tables.create_indexes(client)
+    create_tables.create_daily_tables(client)
+    return conn
@@ -0,0 +1,196 @@
+import itertools
+import json
+import os
+import tempfile
+import time
+from ga_mods import clean_source, compile_channel_rules, load_channel_rules, CHANNEL_RULES
+
+# Check and benchmark for the compiled channel source rules.
+# Compares clean_source with the previous if/elif chain on every channel group and source
+# GA4 reports, plus variants of them, then times both on a multi-year sized export.
+# Run from the scripts folder: python bench_ga_channels.py
+
+ROWS = 2000000
+ROUNDS = 3
+
+CHANNELS = [
+    "Email", "Referral", "Unassigned", "Cross-network", "Direct", "Affiliates", "Display",
+    "Organic Social", "Organic Search", "Organic Shopping", "Paid Social", "Paid Search",
+    "Paid Shopping", "Paid Video", "Paid Other", "Organic Video", "SMS", "Audio", "Mobile Push Notifications",
+    "EMAIL", "paid social ", "Organic Search (custom)", "Direct Email", "", "(other)",
+]
+
+SOURCES = [
+    "klaviyo", "Klaviyo", "shopify_email", "google", "Google Ads", "bing", "yahoo", "duckduckgo",
+    "facebook", "m.facebook.com", "fb", "FB_ads", "instagram", "IGShopping", "pinterest", "reddit",
+    "youtube.com", "(direct)", "(not set)", "tiktok", "", "facebook google", "klaviyo shopify",
+]
+
+
+def old_clean_source(row):
+    channel_source = ''
+
+    # Email
+    if "email" in row[0].lower():
+        if "klaviyo" in row[2].lower():
+            channel_source = "klaviyo"
+        elif "shopify" in row[2].lower():
+            channel_source = "shopify"
+        else:
+            channel_source = 'other'
+
+    # Referral
+    elif "referral" in row[0].lower():
+        channel_source = 'other'
+
+    # Unassigned
+    elif "unassigned" in row[0].lower():
+        channel_source = 'unknown'
+
+    # Cross-network
+    elif "cross-network" in row[0].lower():
+        if "google" in row[2].lower():
+            channel_source = 'google'
+        else:
+            channel_source = 'other'
+
+    # Direct
+    elif "direct" in row[0].lower():
+        channel_source = 'direct'
+
+    # Affiliates
+    elif "affiliates" in row[0].lower():
+        channel_source = 'affiliates'
+
+    # Display
+    elif "display" in row[0].lower():
+        if "google" in row[2].lower():
+            channel_source = 'google'
+        else:
+            channel_source = 'other'
+
+    # Organic Social
+    elif "organic social" in row[0].lower():
+        if "facebook" in row[2].lower():
+            channel_source = 'facebook'
+        elif "instagram" in row[2].lower():
+            channel_source = 'instagram'
+        elif "pinterest" in row[2].lower():
+            channel_source = 'pinterest'
+        elif "reddit" in row[2].lower():
+            channel_source = 'reddit'
+        else:
+            channel_source = 'other'
+
+    # Organic Search
+    elif "organic search" in row[0].lower():
+        if "google" in row[2].lower():
+            channel_source = 'google'
+        elif "bing" in row[2].lower():
+            channel_source = 'bing'
+        elif "yahoo" in row[2].lower():
+            channel_source = 'yahoo'
+        elif "duckduck" in row[2].lower():
+            channel_source = 'duckduckgo'
+        else:
+            channel_source = 'other'
+
+    # Organic Shopping
+    elif "organic shopping" in row[0].lower():
+        if "igshopping" in row[2].lower():
+            channel_source = 'igshopping'
+        elif "google" in row[2].lower():
+            channel_source = 'google'
+        else:
+            channel_source = 'other'
+
+    # Paid Social
+    elif "paid social" in row[0].lower():
+        if "facebook" in row[2].lower():
+            channel_source = 'facebook'
+        elif "fb" in row[2].lower():
+            channel_source = 'facebook'
+        elif "pinterest" in row[2].lower():
+            channel_source = 'pinterest'
+        else:
+            channel_source = 'other'
+
+    # Paid Search
+    elif "paid search" in row[0].lower():
+        if "bing" in row[2].lower():
+            channel_source = 'bing'
+        elif "google" in row[2].lower():
+            channel_source = 'google'
+        else:
+            channel_source = 'other'
+
+    # Paid Shopping
+    elif "paid shopping" in row[0].lower():
+        if "bing" in row[2].lower():
+            channel_source = 'bing'
+        elif "google" in row[2].lower():
+            channel_source = 'google'
+        else:
+            channel_source = 'other'
+
+    # Paid Video
+    elif "paid video" in row[0].lower():
+        if "bing" in row[2].lower():
+            channel_source = 'bing'
+        elif "google" in row[2].lower():
+            channel_source = 'google'
+        else:
+            channel_source = 'other'
+
+    # Paid Other
+    elif "paid other" in row[0].lower():
+        channel_source = 'paid other'
+
+    # Organic Video
+    elif "organic video" in row[0].lower():
+        if "youtube" in row[2].lower():
+            channel_source = 'youtube'
+        else:
+            channel_source = 'other'
+
+    return channel_source
+
+
+def rows(count):
+    pairs = list(itertools.product(CHANNELS, SOURCES))
+    return [(pairs[i % len(pairs)][0], "20240101", pairs[i % len(pairs)][1]) for i in range(count)]
+
+
+def best_time(classify, sample):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for row in sample:
+            classify(row)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# Same source as the if/elif chain for every pair.
+for channel, source in itertools.product(CHANNELS, SOURCES):
+    row = (channel, "20240101", source)
+    assert clean_source(row) == old_clean_source(row), (channel, source, clean_source(row), old_clean_source(row))
+
+# Rules read back from a json config give the same results.
+with tempfile.TemporaryDirectory() as folder:
+    path = os.path.join(folder, "channel_rules.json")
+    with open(path, "w") as f:
+        json.dump(CHANNEL_RULES, f)
+    classify = compile_channel_rules(load_channel_rules(path))
+    for channel, source in itertools.product(CHANNELS, SOURCES):
+        assert classify(channel, source) == old_clean_source((channel, "20240101", source))
+
+sample = rows(ROWS)
+old_time = best_time(old_clean_source, sample)
+new_time = best_time(clean_source, sample)
+
+print(f"{len(CHANNELS) * len(SOURCES)} channel/source pairs match")
+print(f"{ROWS} rows")
+print(f"if/elif chain: {old_time:.3f}s")
+print(f"clean_source: {new_time:.3f}s ({old_time / new_time:.2f}x)")
@@ -0,0 +1,121 @@
+import random
+import time
+from datetime import datetime, timedelta
+import pytz
+from klaviyo_mods import clean_campaigns, match_results
+
+# Benchmark for the Klaviyo campaign transform on synthetic campaigns.
+# Compares clean_campaigns + match_results with the previous pytz cleaning and nested-loop matching.
+# Run from the scripts folder: python bench_klaviyo_campaigns.py
+
+CAMPAIGNS = 50000
+PAGE = 100     # campaigns per get_campaigns page
+ROUNDS = 3
+
+
+def old_clean_time(created_date):
+    dt = datetime.fromisoformat(created_date)
+    formatted_date = dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    utc = pytz.utc
+    central = pytz.timezone("US/Central")
+    order_created_date = datetime.strptime(formatted_date, "%Y-%m-%dT%H:%M:%SZ")
+    utc_time = utc.localize(order_created_date)
+    central_time = utc_time.astimezone(central)
+
+    return central_time
+
+
+def old_clean_campaigns(campaigns):
+    cleaned = []
+    for i in range(len(campaigns['data'])):
+        camp_name = campaigns['data'][i]['attributes']['name']
+        camp_id = campaigns['data'][i]['id']
+        campaigns['data'][i]['relationships']['campaign-messages']['data'][0]['id'] # looked up but unused, kept for timing
+        camp_subject_line = campaigns['included'][i]['attributes']['content']['subject']
+        camp_preview_text = campaigns['included'][i]['attributes']['content']['preview_text']
+        old_clean_time(campaigns['data'][i]['attributes']['created_at']).strftime("%Y-%m-%d %H:%M:%S %Z") # converted but unused, kept for timing
+        send_time = old_clean_time(campaigns['data'][i]['attributes']['send_time']).strftime("%Y-%m-%d")
+
+        cleaned.append((
+            camp_id,
+            camp_name,
+            camp_subject_line,
+            camp_preview_text,
+            send_time
+        ))
+
+    return cleaned
+
+
+def old_match_results(camp_list, kpi_list):
+    matched_result = [
+        (*a, *b[1:])
+        for a in camp_list
+        for b in kpi_list
+        if a[0] == b[0]
+    ]
+    return matched_result
+
+
+def sample_page(start):
+    data, included = [], []
+    for i in range(start, start + PAGE):
+        sent = datetime(2024, 1, 1) + timedelta(hours=i, minutes=i % 60)
+        sent = sent.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        data.append({
+            'id': f"C{i}",
+            'attributes': {'name': f"Campaign {i}", 'created_at': sent, 'send_time': sent},
+            'relationships': {'campaign-messages': {'data': [{'id': f"M{i}"}]}},
+        })
+        included.append({'id': f"M{i}", 'attributes': {'content': {'subject': f"Subject {i}", 'preview_text': f"Preview {i}"}}})
+    return {'data': data, 'included': included}
+
+
+def sample_kpis(camps):
+    # Reporting API results come back in their own order
+    kpis = [(camp[0], 1000, 400, 40, 3, 2, 1, 0) for camp in camps]
+    random.shuffle(kpis)
+    return kpis
+
+
+def transform(clean, match, pages, kpis):
+    rows = []
+    for page, page_kpis in zip(pages, kpis):
+        rows.extend(match(clean(page), page_kpis))
+    return rows
+
+
+def best_time(clean, match, pages, kpis):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        transform(clean, match, pages, kpis)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+random.seed(0)
+pages = [sample_page(start) for start in range(0, CAMPAIGNS, PAGE)]
+kpis = [sample_kpis(clean_campaigns(page)) for page in pages]
+
+# Same rows in the same order as the previous transform.
+assert transform(clean_campaigns, match_results, pages, kpis) == transform(old_clean_campaigns, old_match_results, pages, kpis)
+
+old_time = best_time(old_clean_campaigns, old_match_results, pages, kpis)
+new_time = best_time(clean_campaigns, match_results, pages, kpis)
+
+# Matching alone on one batch the size of a whole sync, where the nested loop hurts most.
+camps = [row for page in pages[:50] for row in clean_campaigns(page)]
+all_kpis = sample_kpis(camps)
+start = time.perf_counter()
+old_match_results(camps, all_kpis)
+old_match_time = time.perf_counter() - start
+start = time.perf_counter()
+match_results(camps, all_kpis)
+new_match_time = time.perf_counter() - start
+
+print(f"{CAMPAIGNS} campaigns in pages of {PAGE}")
+print(f"previous transform: {old_time:.3f}s")
+print(f"clean_campaigns + match_results: {new_time:.3f}s ({old_time / new_time:.2f}x)")
+print(f"match {len(camps)} campaigns in one batch: {old_match_time:.3f}s -> {new_match_time:.4f}s")
@@ -0,0 +1,129 @@
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+import create_tables
+from bench_db import create_db
+from shopify_loaders import commit_page
+
+# Check and benchmark for {client}_daily_orders and {client}_customer_summary.
+# Loads synthetic orders page by page in shuffled order (so earlier orders of a customer
+# can arrive later), checks the rollup against aggregates of the raw table, then times a
+# monthly report and a first time customers count on both for a growing order history.
+# Run from the scripts folder: python bench_rollups.py
+
+CLIENT = "bench"
+CUSTOMERS = 5000
+GUEST_SHARE = 0.05 # orders placed as guests, they share customer id 1 like clean_page gives them
+PAGE = 250
+ROUNDS = 5
+HISTORY_ORDERS = [20000, 100000, 400000]
+
+RAW_REPORT = f"""
+SELECT SUBSTR(order_date, 1, 7), COUNT(order_id), SUM(order_total), SUM(order_discounts),
+    SUM(order_shipping), SUM(order_cost)
+FROM {CLIENT}_orders
+WHERE order_date >= ? AND order_date < ?
+GROUP BY SUBSTR(order_date, 1, 7)"""
+
+ROLLUP_REPORT = f"""
+SELECT SUBSTR(order_date, 1, 7), SUM(total_orders), SUM(total_sales), SUM(total_discounts),
+    SUM(total_shipping), SUM(total_cost)
+FROM {CLIENT}_daily_orders
+WHERE order_date >= ? AND order_date < ?
+GROUP BY SUBSTR(order_date, 1, 7)"""
+
+RAW_NEW_CUSTOMERS = f"""
+SELECT COUNT(DISTINCT O.customer_id) FROM {CLIENT}_orders O
+WHERE O.order_date >= ? AND O.order_date < ? AND O.customer_id <> '1'
+AND NOT EXISTS (
+    SELECT 1 FROM {CLIENT}_orders P
+    WHERE P.customer_id = O.customer_id AND P.order_date < O.order_date)"""
+
+ROLLUP_NEW_CUSTOMERS = f"""
+SELECT SUM(new_customers) FROM {CLIENT}_daily_orders
+WHERE order_date >= ? AND order_date < ?"""
+
+RAW_SUMMARY = f"""
+SELECT customer_id, MIN(order_date), MAX(order_date), COUNT(order_id), ROUND(SUM(order_total), 2)
+FROM {CLIENT}_orders WHERE customer_id <> '1' GROUP BY customer_id ORDER BY customer_id"""
+
+SUMMARY = f"""
+SELECT customer_id, first_order_date, last_order_date, order_count, ROUND(lifetime_revenue, 2)
+FROM {CLIENT}_customer_summary ORDER BY customer_id"""
+
+# The first time customers query the chat prompt used before the summary table
+RAW_FIRST_TIME = f"""
+SELECT COUNT(DISTINCT o.customer_id) FROM {CLIENT}_orders AS o
+WHERE o.order_date BETWEEN ? AND ? AND o.customer_id <> '1'
+AND o.order_date = (SELECT MIN(o2.order_date) FROM {CLIENT}_orders AS o2 WHERE o2.customer_id = o.customer_id)"""
+
+SUMMARY_FIRST_TIME = f"""
+SELECT COUNT(*) FROM {CLIENT}_customer_summary WHERE first_order_date BETWEEN ? AND ?"""
+
+
+def sample_orders(count, days):
+    start = date(2022, 1, 1)
+    orders = []
+    for i in range(count):
+        order_date = str(start + timedelta(days=random.randrange(days)))
+        customer_id = f"gid://shopify/Customer/{random.randrange(CUSTOMERS)}"
+        if random.random() < GUEST_SHARE:
+            customer_id = 1
+        total = round(random.uniform(10, 300), 2)
+        orders.append((f"gid://shopify/Order/{i}", order_date, f"#{i}", total, round(total * 0.4, 2), "",
+                       round(total * 0.05, 2), 5.0, "web", customer_id, "Customer"))
+    return orders
+
+
+def load(db_path, orders):
+    random.shuffle(orders)
+    for start in range(0, len(orders), PAGE):
+        commit_page(CLIENT, orders[start:start + PAGE], [], [], db_path=db_path)
+
+
+def best_time(conn, query, params):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def rounded(rows):
+    return [tuple(round(v, 2) if isinstance(v, float) else v for v in row) for row in rows]
+
+
+random.seed(0)
+with tempfile.TemporaryDirectory() as tmp:
+    # Rollup equals the raw aggregates after out of order incremental loads
+    db_path = os.path.join(tmp, "check.db")
+    conn = create_db(db_path, CLIENT)
+    load(db_path, sample_orders(20000, 730))
+    for params in [("2022-01-01", "2024-01-01"), ("2022-03-01", "2022-04-01"), ("2023-06-10", "2023-06-11")]:
+        assert rounded(conn.execute(RAW_REPORT, params).fetchall()) == rounded(conn.execute(ROLLUP_REPORT, params).fetchall())
+        assert conn.execute(RAW_NEW_CUSTOMERS, params).fetchone() == conn.execute(ROLLUP_NEW_CUSTOMERS, params).fetchone()
+        assert conn.execute(RAW_FIRST_TIME, params).fetchone() == conn.execute(SUMMARY_FIRST_TIME, params).fetchone()
+    assert conn.execute(RAW_SUMMARY).fetchall() == conn.execute(SUMMARY).fetchall()
+    conn.close()
+
+    for count in HISTORY_ORDERS:
+        db_path = os.path.join(tmp, f"history_{count}.db")
+        conn = create_db(db_path, CLIENT)
+        conn.executemany(f"INSERT INTO {CLIENT}_orders VALUES (?,?,?,?,?,?,?,?,?,?,?)", sample_orders(count, 1095))
+        conn.commit()
+        create_tables.create_daily_tables(CLIENT)
+
+        params = ("2022-01-01", "2025-01-01")
+        raw = best_time(conn, RAW_REPORT, params)
+        rollup = best_time(conn, ROLLUP_REPORT, params)
+        print(f"{count} orders, monthly report over 3 years: {raw * 1000:.1f}ms -> {rollup * 1000:.2f}ms ({raw / rollup:.0f}x)")
+
+        params = ("2024-05-01", "2024-05-31")
+        raw = best_time(conn, RAW_FIRST_TIME, params)
+        summary = best_time(conn, SUMMARY_FIRST_TIME, params)
+        print(f"{count} orders, first time customers in a month: {raw * 1000:.1f}ms -> {summary * 1000:.2f}ms ({raw / summary:.0f}x)")
+        conn.close()
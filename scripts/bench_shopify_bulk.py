@@ -0,0 +1,88 @@
+import json
+import os
+import pathlib
+import tempfile
+import time
+import shopify_main
+from bench_db import create_db
+from shopify_bulk import stream_bulk_orders
+
+# Check and benchmark for the bulk operation path against a recorded JSONL result.
+# A fake execute answers the bulk mutation and status queries with a file:// url to the
+# sample, then sync_orders_bulk streams it into a temporary database. Checks that every
+# order and line item in the file is loaded under the right order, that line items whose
+# order is not the current one are reported, then times a larger copy of the sample.
+# Run from the scripts folder: python bench_shopify_bulk.py
+
+CLIENT = "bench"
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "shopify_bulk_orders.jsonl")
+COPIES = 2000 # copies of the sample orders in the timed file
+
+
+def fake_execute(url):
+    def execute(query):
+        if "bulkOperationRunQuery" in query:
+            return {'data': {'bulkOperationRunQuery': {'bulkOperation': {'id': "gid://shopify/BulkOperation/1", 'status': "CREATED"}, 'userErrors': []}}}
+        return {'data': {'currentBulkOperation': {'id': "gid://shopify/BulkOperation/1", 'status': "COMPLETED", 'errorCode': None, 'objectCount': 0, 'url': url}}}
+    return execute
+
+
+def sync_file(path, db_path):
+    shopify_main.execute_gql = fake_execute(pathlib.Path(path).as_uri())
+    shopify_main.sync_orders_bulk(CLIENT, "created_at:>='2024-01-01'", db_path)
+
+
+def numeric_id(gid):
+    return gid.split("/")[-1]
+
+
+def copy_sample(rows, copies):
+    """Renumbers the sample orders and line items `copies` times."""
+    lines = []
+    for copy in range(copies):
+        for row in rows:
+            row = dict(row)
+            row['id'] = f"{row['id']}-{copy}"
+            if '__parentId' in row:
+                row['__parentId'] = f"{row['__parentId']}-{copy}"
+            lines.append(json.dumps(row) + "\n")
+    return lines
+
+
+with open(SAMPLE) as f:
+    sample = [json.loads(line) for line in f if line.strip()]
+orders = [row for row in sample if '__parentId' not in row]
+line_items = [row for row in sample if '__parentId' in row]
+
+with tempfile.TemporaryDirectory() as tmp:
+    # Every recorded order and line item is loaded, each line item under its order
+    db_path = os.path.join(tmp, "check.db")
+    conn = create_db(db_path, CLIENT)
+    sync_file(SAMPLE, db_path)
+    assert conn.execute(f"SELECT COUNT(*) FROM {CLIENT}_orders").fetchone()[0] == len(orders)
+    loaded = dict(conn.execute(f"SELECT line_item_id, order_id FROM {CLIENT}_line_items"))
+    assert loaded == {numeric_id(row['id']): numeric_id(row['__parentId']) for row in line_items}
+    conn.close()
+
+    # Line items that arrive after their order, or without one, are counted instead of attached elsewhere
+    moved = [json.dumps(row) for row in sample]
+    moved.append(moved.pop(1)) # first line item of the first order, now at the end of the file
+    moved.append(json.dumps(dict(line_items[0], __parentId="gid://shopify/Order/missing")))
+    streamed = list(stream_bulk_orders(moved))
+    assert len(streamed) == len(orders)
+    assert sum(len(order['node']['lineItems']['edges']) for order in streamed) == len(line_items) - 1
+
+    # Timing on a larger file
+    big_path = os.path.join(tmp, "big.jsonl")
+    with open(big_path, "w") as f:
+        f.writelines(copy_sample(sample, COPIES))
+    db_path = os.path.join(tmp, "big.db")
+    conn = create_db(db_path, CLIENT)
+    start = time.perf_counter()
+    sync_file(big_path, db_path)
+    elapsed = time.perf_counter() - start
+    assert conn.execute(f"SELECT COUNT(*) FROM {CLIENT}_line_items").fetchone()[0] == len(line_items) * COPIES
+    conn.close()
+
+print(f"{len(orders)} recorded orders and {len(line_items)} line items loaded and checked")
+print(f"{len(orders) * COPIES} orders from a bulk file in {elapsed:.2f}s ({len(orders) * COPIES / elapsed:.0f} orders/s)")
@@ -0,0 +1,242 @@
+import time
+from datetime import datetime
+from shopify_loaders import check_sku, clean_page, clean_tags
+
+# Micro-benchmark for clean_page against the previous three-pass cleaners.
+# Run from the scripts folder: python bench_shopify_cleaners.py
+
+ORDERS = 250   # orders per page, same as querygql
+PAGES = 200
+ROUNDS = 3
+
+
+def old_clean_time(created_date):
+    dt = datetime.fromisoformat(created_date.replace('Z', '+00:00'))
+    sqlite_string = dt.strftime('%Y-%m-%d')
+    return sqlite_string
+
+
+def old_return_line_item_total(line_items):
+    """Returns a dictionary containing total quanties and total cost."""
+    total_cost = 0
+    for node in line_items:
+        item = node['node']
+        quantity = item['quantity']
+        try:
+            cost = float(item['variant']['inventoryItem']['unitCost']['amount'])
+        except:
+            cost = 0.0
+        total = quantity * cost
+        total_cost += total
+    return total_cost
+
+
+def old_clean_orders(orders):
+    clean_nodes = []
+    for order in orders:
+        n = order['node']
+        order_created_date = old_clean_time(n['processedAt'])
+        order_id = n['id'].split("/")[-1]
+        order_name = n['name']
+        sales_channel_source = n['sourceName']
+        order_tags = clean_tags(n['tags'])
+        order_total = round(float(n['totalPriceSet']['shopMoney']['amount']), 2)
+        order_cost = round(old_return_line_item_total(n['lineItems']['edges']), 2)
+        order_discounts = round(float(n['totalDiscountsSet']['shopMoney']['amount']), 2)
+        order_shipping = round(float(n['totalShippingPriceSet']['shopMoney']['amount']), 2)
+
+        customer = n['customer']
+
+        try:
+            customer_name = customer['displayName']
+            customer_id = customer['id'].split("/")[-1]
+
+        except:
+            customer_name = "N/A"
+            customer_id = 1  
+
+        cleaned_row = (
+            order_id, order_created_date, order_name, order_total, order_cost,
+            order_tags, order_discounts, order_shipping,
+            sales_channel_source, customer_id, customer_name
+        )
+        clean_nodes.append(cleaned_row)
+    return clean_nodes
+
+
+def old_clean_customers(orders):
+    """Clean daily customers info and returns a list of tuples."""
+
+    clean_nodes = []
+
+    for order in orders:
+        n = order['node']
+        customer = n['customer']
+
+        try:
+            customer_name = customer['displayName']
+            customer_id = customer['id'].split("/")[-1]
+            customer_email = customer['email']
+            customer_tags = clean_tags(customer['tags'])
+        except:
+            customer_name = "N/A"
+            customer_id = 1
+            customer_email = None
+            customer_tags = None
+        
+        try:
+            address = customer['defaultAddress']
+            customer_city = address['city']
+            country_name = address['country']
+            country_code = address['countryCodeV2']
+            state_province_name = address['province']
+            state_province_code = address['provinceCode']
+        except:
+            customer_city = None
+            country_name = None
+            country_code = None
+            state_province_name = None
+            state_province_code = None
+
+        cleaned_row = (
+            customer_id, customer_name, customer_email, customer_city,
+            state_province_code, country_code, state_province_name,
+            country_name, customer_tags
+        )
+        clean_nodes.append(cleaned_row)
+    return clean_nodes
+
+
+def old_clean_line_items(orders):
+    """Clean line items and returns a list of tuples."""
+    clean_nodes = []
+
+    for order in orders:
+        n = order['node']
+        order_id = n['id'].split("/")[-1]
+        order_name = n['name']
+        customer = n['customer']
+
+        try:
+            customer_id = customer['id'].split("/")[-1]
+        except:
+            customer_id = None
+
+        line_items = n['lineItems']['edges']
+
+        for line_item in line_items:
+            line = line_item['node']
+            line_id = line['id'].split("/")[-1]
+
+            try:
+                product = line['product']
+                product_id = product['id'].split("/")[-1]
+                product_tags = clean_tags(product['tags'])
+                product_vendor = product['vendor']
+            except:
+                product_id = None
+                product_tags = None
+                product_vendor = None
+
+            line_quantity = int(line['quantity'])
+            line_sku = check_sku(line)
+            line_title = line['title']
+
+            try:
+                line_cost = float(line['variant']['inventoryItem']['unitCost']['amount'])
+            except:
+                line_cost = None
+            
+            try:
+                line_msrp = float(line['originalUnitPriceSet']['shopMoney']['amount'])
+            except:
+                line_msrp = None
+
+            line_discount = float(line['totalDiscountSet']['shopMoney']['amount'])
+            line_unit_price = round((line_msrp * line_quantity - line_discount)/line_quantity,2)
+            line_unit_discount = round(line_discount/line_quantity,2)
+
+            cleaned_row = (
+                line_id, order_id, order_name, customer_id, line_sku, line_title,
+                product_vendor, line_quantity, line_unit_price, line_cost,
+                line_unit_discount, product_id, product_tags
+            )
+            clean_nodes.append(cleaned_row)
+    return clean_nodes
+
+
+def money(amount):
+    return {'shopMoney': {'amount': str(amount)}}
+
+
+def sample_order(i):
+    line_items = []
+    for j in range(i % 6 + 1):
+        line_items.append({'node': {
+            'product': {'id': f"gid://shopify/Product/{j}", 'tags': ['summer', 'sale'], 'vendor': "Vendor"} if j % 4 else None,
+            'id': f"gid://shopify/LineItem/{i * 10 + j}",
+            'sku': f"SKU-{j}" if j % 2 else None,
+            'quantity': j + 1,
+            'title': f"Product {j}",
+            'customAttributes': [{'key': 'sku', 'value': f"CUSTOM-{j}"}],
+            'originalUnitPriceSet': money(19.99 + j),
+            'totalDiscountSet': money(j * 0.5),
+            'variant': {'price': "19.99", 'inventoryItem': {'unitCost': money(7.25)['shopMoney'] if j % 3 else None}},
+        }})
+
+    customer = None
+    if i % 10:
+        customer = {
+            'id': f"gid://shopify/Customer/{i % 500}",
+            'displayName': f"Customer {i % 500}",
+            'tags': ['vip'],
+            'email': f"customer{i % 500}@example.com",
+            'defaultAddress': {'city': "Austin", 'province': "Texas", 'provinceCode': "TX", 'country': "United States", 'countryCodeV2': "US"} if i % 7 else None,
+        }
+
+    return {'node': {
+        'id': f"gid://shopify/Order/{i}",
+        'createdAt': "2024-05-01T15:04:05Z",
+        'updatedAt': "2024-05-02T15:04:05Z",
+        'processedAt': "2024-05-01T15:04:05Z",
+        'name': f"#{1000 + i}",
+        'sourceName': "web",
+        'tags': ['wholesale'],
+        'totalDiscountsSet': money(5),
+        'totalShippingPriceSet': money(9.99),
+        'totalPriceSet': money(120.5),
+        'lineItems': {'edges': line_items},
+        'customer': customer,
+    }}
+
+
+def three_pass(page):
+    return old_clean_orders(page), old_clean_customers(page), old_clean_line_items(page)
+
+
+def best_time(cleaner, pages):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for page in pages:
+            cleaner(page)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+pages = [[sample_order(p * ORDERS + i) for i in range(ORDERS)] for p in range(PAGES)]
+
+# Same rows as the three-pass cleaners, customers only lose their duplicates.
+orders, customers, line_items = three_pass(pages[0])
+fused_orders, fused_customers, fused_line_items = clean_page(pages[0])
+assert fused_orders == orders
+assert fused_line_items == line_items
+assert fused_customers == list({row[0]: row for row in customers}.values())
+
+three_pass_time = best_time(three_pass, pages)
+fused_time = best_time(clean_page, pages)
+
+print(f"{PAGES} pages x {ORDERS} orders")
+print(f"three pass: {three_pass_time:.3f}s")
+print(f"clean_page: {fused_time:.3f}s ({three_pass_time / fused_time:.2f}x)")
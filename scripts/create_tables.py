@@ -1,8 +1,5 @@
-import sqlite3
-
-# Connect to the SQLite3 database
-conn = sqlite3.connect('shop.db')
-cursor = conn.cursor()
+from shop_db import connect, client_db_path, bump_data_version
+from rollups import refresh_customer_summary, refresh_daily_orders, refresh_daily_channels, refresh_daily_email
 
 clients = [] # account prefix that will identify each client database tables ("d1","d2","d3",etc.)
 
@@ -94,12 +91,104 @@ def create_google_analytics(client):
         );""")
     conn.commit()
 
+def create_sync_state(client):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {client}_sync_state (
+            sync_key TEXT PRIMARY KEY,
+            sync_value TEXT
+        );""")
+    conn.commit()
+
+def create_quarantine(client):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {client}_quarantine (
+            table_name TEXT,
+            row_data TEXT,
+            error TEXT,
+            quarantined_at TEXT
+        );""")
+    conn.commit()
+
+def create_indexes(client):
+    # Loaders store dates as YYYY-MM-DD, rows loaded with a time are trimmed so
+    # reports can compare the columns directly and use these indexes.
+    for table, column in [("orders", "order_date"), ("google_analytics", "channel_date"), ("klaviyo_campaigns", "sent_time")]:
+        cursor.execute(f"UPDATE {client}_{table} SET {column} = DATE({column}) WHERE {column} <> DATE({column});")
+
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {client}_orders_order_date_idx ON {client}_orders (order_date);")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {client}_orders_customer_id_idx ON {client}_orders (customer_id, order_date);")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {client}_line_items_order_id_idx ON {client}_line_items (order_id);")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {client}_line_items_product_sku_idx ON {client}_line_items (product_sku);")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {client}_google_analytics_channel_date_idx ON {client}_google_analytics (channel_date);")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {client}_klaviyo_campaigns_sent_time_idx ON {client}_klaviyo_campaigns (sent_time);")
+    conn.commit()
+
+def create_daily_tables(client):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {client}_customer_summary (
+            customer_id TEXT PRIMARY KEY,
+            first_order_date TEXT,
+            last_order_date TEXT,
+            order_count INTEGER,
+            lifetime_revenue REAL
+        );""")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {client}_customer_summary_first_order_date_idx ON {client}_customer_summary (first_order_date);")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {client}_daily_orders (
+            order_date TEXT PRIMARY KEY,
+            total_orders INTEGER,
+            total_sales REAL,
+            total_discounts REAL,
+            total_shipping REAL,
+            total_cost REAL,
+            new_customers INTEGER
+        );""")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {client}_daily_channels (
+            channel_date TEXT,
+            channel_name TEXT,
+            channel_sessions INTEGER,
+            channel_carts INTEGER,
+            channel_checkouts INTEGER,
+            channel_transactions REAL,
+            channel_revenue REAL,
+            PRIMARY KEY (channel_date, channel_name)
+        );""")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {client}_daily_email (
+            sent_date TEXT PRIMARY KEY,
+            total_campaigns INTEGER,
+            delivered_emails INTEGER,
+            opens INTEGER,
+            clicks INTEGER,
+            conversions INTEGER,
+            unsubscribes INTEGER,
+            bounced INTEGER,
+            spam_complaints INTEGER
+        );""")
+
+    # Rebuilt from the raw tables, after this the loaders keep them up to date
+    refresh_customer_summary(conn, client)
+    refresh_daily_orders(conn, client)
+    refresh_daily_channels(conn, client)
+    refresh_daily_email(conn, client)
+    bump_data_version(conn, client) # dates may have been trimmed, cached chat results are dropped
+    conn.commit()
+
 for client in clients:
+    # Connect to the client's SQLite3 database, this also switches it to WAL mode
+    conn = connect(client_db_path(client, 'shop.db'))
+    cursor = conn.cursor()
+
     create_orders_table(client)
     create_customers_table(client)
     create_line_items_table(client)
     create_klaviyo_campaigns(client)
     create_google_analytics(client)
+    create_sync_state(client)
+    create_quarantine(client)
+    create_indexes(client)
+    create_daily_tables(client)
 
-conn.close()
+    conn.close()
 
@@ -1,31 +1,108 @@
 import os
-from ga_mods import run_report, clean_channels, load_channels
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from shop_db import client_db_path, get_sync_state, set_sync_state
+from ga_mods import date_windows, report_pages, clean_channels, load_channels, last_channel_date, classify_source, compile_channel_rules, load_channel_rules
 
 clients = [] # account prefix that will identify each client database tables ("d1","d2","d3",etc.)
 
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-for client_id in clients:
-    # key = account prefix
-    # value = account ga4 property id.
-    # prefilled with example data
-    client_ids = {
-        "d1": "0001",
-        "d2":"0002",
-        "d3":"0003",
-    }
+# key = account prefix
+# value = account ga4 property id.
+# prefilled with example data
+client_ids = {
+    "d1": "0001",
+    "d2":"0002",
+    "d3":"0003",
+}
 
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.join(base_dir, 'creds', 'ga_creds.json')
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.join(base_dir, 'creds', 'ga_creds.json')
 
-    DB_PATH = 'shop.db'
+DB_PATH = 'shop.db'
 
+start_date = "2024-01-01"  # Start to load data date.
+end_date = "2025-12-31"    # Always set to a future date.
+
+# "full" reloads every day from start_date to end_date.
+# "incremental" only requests days since the last loaded channel_date, minus LOOKBACK_DAYS
+# because GA keeps revising the most recent days (falls back to start_date on the first run).
+sync_mode = "full"
+
+LOOKBACK_DAYS = 3
+
+WATERMARK_KEY = "ga_channels_synced_through" # last day of the latest sync whose windows all loaded
+
+# Reports for every property and date window share one GA client and run concurrently.
+# GA_WORKERS caps the requests in flight across all properties, standard GA4 properties
+# allow 10 concurrent requests each and every request spends the property's hourly tokens.
+GA_WORKERS = 4
+WINDOW_DAYS = 90 # each property's dates are split into windows of this many days
+
+report_slots = threading.BoundedSemaphore(GA_WORKERS)
+
+# Optional json file with custom channel source rules, same format as CHANNEL_RULES in ga_mods.py.
+CHANNEL_RULES_FILE = None
+
+classify = classify_source
+if CHANNEL_RULES_FILE != None:
+    classify = compile_channel_rules(load_channel_rules(CHANNEL_RULES_FILE))
+
+
+def sync_window(client_id, property_id, window_start, window_end, db_path):
+    with report_slots:
+        # Each page of the report is cleaned and loaded before the next one is requested
+        for run_sample in report_pages(property_id, window_start, window_end):
+            rows = clean_channels(run_sample, classify)
+
+            load_channels(rows, db_path, client_id)
+
+
+def sync_channels(client_id):
     property_id = client_ids[client_id]
-    start_date = "2024-01-01"  # Start to load data date.
-    end_date = "2025-12-31"    # Always set to a future date.
+    db_path = client_db_path(client_id, DB_PATH)
+
+    report_start = start_date
+    if sync_mode == "incremental":
+        # Databases synced before the watermark existed start from the latest loaded day
+        last_date = get_sync_state(client_id, WATERMARK_KEY, db_path) or last_channel_date(client_id, db_path)
+        if last_date != None:
+            report_start = max(start_date, str(date.fromisoformat(last_date) - timedelta(days=LOOKBACK_DAYS)))
+        print(f"{client_id} syncing GA4 data since {report_start}")
+
+    # Days after today have no data yet, there is no need to spend quota on them
+    report_end = min(end_date, str(date.today()))
+    windows = date_windows(report_start, report_end, WINDOW_DAYS)
+
+    with ThreadPoolExecutor(max_workers=GA_WORKERS) as pool:
+        jobs = [(window, pool.submit(sync_window, client_id, property_id, *window, db_path)) for window in windows]
+
+    # Every window runs to the end, then the client fails if any of them did
+    failed = [(window, job.exception()) for window, job in jobs if job.exception() is not None]
+    for (window_start, window_end), error in failed:
+        print(f"{client_id} GA4 {window_start} to {window_end} failed: {error}")
+    if failed:
+        # Days before the first failed window all loaded, the next incremental sync starts again from there
+        first_failed = min(window_start for (window_start, window_end), error in failed)
+        set_sync_state(client_id, WATERMARK_KEY, str(date.fromisoformat(first_failed) - timedelta(days=1)), db_path)
+        raise RuntimeError(f"{client_id} GA4 sync failed for {len(failed)} of {len(windows)} date windows")
+
+    set_sync_state(client_id, WATERMARK_KEY, report_end, db_path)
+    print(f"{client_id} GA4 data done loading.\n")
+
+
+def sync_all_channels(client_list):
+    """Syncs every client's property at the same time, requests still share report_slots."""
+    with ThreadPoolExecutor(max_workers=GA_WORKERS) as pool:
+        jobs = [(client_id, pool.submit(sync_channels, client_id)) for client_id in client_list]
 
-    run_sample = run_report(property_id, start_date, end_date)
-    rows = clean_channels(run_sample)
+    failed = [client_id for client_id, job in jobs if job.exception() is not None]
+    for client_id in failed:
+        print(f"{client_id} GA4 sync failed: {dict(jobs)[client_id].exception()}")
+    if failed:
+        raise RuntimeError(f"GA4 sync failed for {', '.join(failed)}")
 
-    load_channels(rows, DB_PATH, client_id)
 
-    print(f"{client_id} GA4 data done loading.\n")
\ No newline at end of file
+if __name__ == "__main__":
+    sync_all_channels(clients)
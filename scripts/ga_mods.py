@@ -3,184 +3,205 @@ from google.analytics.data_v1beta.types import (
     DateRange,
     Dimension,
     Metric,
+    OrderBy,
     RunReportRequest
 )
+from google.api_core.exceptions import ResourceExhausted
 
-from datetime import datetime
-import sqlite3
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+import json
+import threading
+import time
+from shop_db import writer, connect, bump_data_version
+from rollups import refresh_daily_channels
 
 def clean_date(date_input):
     formatted_date = datetime.strptime(date_input, "%Y%m%d").date()
     return str(formatted_date)
 
-def run_report(property_id, start_date, end_date):
-    """Runs a report of active users grouped by country."""
-    client = BetaAnalyticsDataClient()
-
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[
-            Dimension(name="sessionDefaultChannelGroup"),
-            Dimension(name="date"),
-            Dimension(name="sessionSource"),
-        ],
-        metrics=[
-            Metric(name="sessions"),
-            Metric(name="addToCarts"),
-            Metric(name="checkouts"),
-            Metric(name="transactions"),
-            Metric(name="totalRevenue")
-        ],
-        date_ranges=[DateRange(start_date=start_date, end_date=end_date)],
+REPORT_PAGE_SIZE = 100000 # rows per request, the API returns at most 250,000
+QUOTA_RETRIES = 5 # retries when a property is out of quota tokens or concurrent requests
+CLASSIFY_CACHE_SIZE = 4096 # (channel, source) pairs kept by compile_channel_rules, sources can be referral urls or utm values
+
+ga_client = None
+ga_client_lock = threading.Lock()
+
+def get_client():
+    """Returns the BetaAnalyticsDataClient shared by every report in this process."""
+    global ga_client
+    with ga_client_lock:
+        if ga_client is None:
+            ga_client = BetaAnalyticsDataClient()
+        return ga_client
+
+def date_windows(start_date, end_date, days):
+    """Splits start_date to end_date (inclusive) into windows of at most `days` days."""
+    windows = []
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    while start <= end:
+        window_end = min(end, start + timedelta(days=days - 1))
+        windows.append((str(start), str(window_end)))
+        start = window_end + timedelta(days=1)
+    return windows
+
+def log_quota(property_id, quota):
+    """Prints how much of the property's GA4 quota is left after a request."""
+    if not quota:
+        return
+    print(
+        f"properties/{property_id} quota left: {quota.tokens_per_day.remaining} tokens today, "
+        f"{quota.tokens_per_hour.remaining} this hour, {quota.concurrent_requests.remaining} concurrent requests"
     )
-    response = client.run_report(request)
-
-    rows = []
-    for x in response.rows:
-        dimension_values = [dim.value for dim in x.dimension_values]
-        # Extract metric values
-        metric_values = [met.value for met in x.metric_values]
-        # Combine into a tuple
-        result_tuple = tuple(dimension_values + metric_values)
-        rows.append(result_tuple)
-    
-    return rows
-
-def clean_source(row):
-    channel_source = ''
-
-    # Email
-    if "email" in row[0].lower():
-        if "klaviyo" in row[2].lower():
-            channel_source = "klaviyo"
-        elif "shopify" in row[2].lower():
-            channel_source = "shopify"
-        else:
-            channel_source = 'other'
-    
-    # Referral
-    elif "referral" in row[0].lower():
-        channel_source = 'other'
-    
-    # Unassigned
-    elif "unassigned" in row[0].lower():
-        channel_source = 'unknown'
-
-    # Cross-network
-    elif "cross-network" in row[0].lower():
-        if "google" in row[2].lower():
-            channel_source = 'google'
-        else:
-            channel_source = 'other'
-    
-    # Direct
-    elif "direct" in row[0].lower():
-        channel_source = 'direct'
-
-    # Affiliates
-    elif "affiliates" in row[0].lower():
-        channel_source = 'affiliates'
-
-    # Display
-    elif "display" in row[0].lower():
-        if "google" in row[2].lower():
-            channel_source = 'google'
-        else:
-            channel_source = 'other'
-
-    # Organic Social
-    elif "organic social" in row[0].lower():
-        if "facebook" in row[2].lower():
-            channel_source = 'facebook'
-        elif "instagram" in row[2].lower():
-            channel_source = 'instagram'
-        elif "pinterest" in row[2].lower():
-            channel_source = 'pinterest'
-        elif "reddit" in row[2].lower():
-            channel_source = 'reddit'
-        else:
-            channel_source = 'other'
-    
-    # Organic Search
-    elif "organic search" in row[0].lower():
-        if "google" in row[2].lower():
-            channel_source = 'google'
-        elif "bing" in row[2].lower():
-            channel_source = 'bing'
-        elif "yahoo" in row[2].lower():
-            channel_source = 'yahoo'
-        elif "duckduck" in row[2].lower():
-            channel_source = 'duckduckgo'
-        else:
-            channel_source = 'other'
-    
-    # Organic Shopping
-    elif "organic shopping" in row[0].lower():
-        if "igshopping" in row[2].lower():
-            channel_source = 'igshopping'
-        elif "google" in row[2].lower():
-            channel_source = 'google'
-        else:
-            channel_source = 'other'
-    
-    # Paid Social
-    elif "paid social" in row[0].lower():
-        if "facebook" in row[2].lower():
-            channel_source = 'facebook'
-        elif "fb" in row[2].lower():
-            channel_source = 'facebook'
-        elif "pinterest" in row[2].lower():
-            channel_source = 'pinterest'
-        else:
-            channel_source = 'other'
-
-    # Paid Search
-    elif "paid search" in row[0].lower():
-        if "bing" in row[2].lower():
-            channel_source = 'bing'
-        elif "google" in row[2].lower():
-            channel_source = 'google'
-        else:
-            channel_source = 'other'
-    
-    # Paid Shopping
-    elif "paid shopping" in row[0].lower():
-        if "bing" in row[2].lower():
-            channel_source = 'bing'
-        elif "google" in row[2].lower():
-            channel_source = 'google'
-        else:
-            channel_source = 'other'
-
-    # Paid Video
-    elif "paid video" in row[0].lower():
-        if "bing" in row[2].lower():
-            channel_source = 'bing'
-        elif "google" in row[2].lower():
-            channel_source = 'google'
-        else:
-            channel_source = 'other'
-
-    # Paid Other
-    elif "paid other" in row[0].lower():
-        channel_source = 'paid other'
-
-    # Organic Video
-    elif "organic video" in row[0].lower():
-        if "youtube" in row[2].lower():
-            channel_source = 'youtube'
-        else:
-            channel_source = 'other'
-
-    return channel_source
-
-def clean_channels(channels):
+
+def request_report(client, property_id, request):
+    """Runs one report request, waiting and retrying while the property is out of quota."""
+    for attempt in range(QUOTA_RETRIES + 1):
+        try:
+            response = client.run_report(request)
+        except ResourceExhausted as e:
+            if attempt == QUOTA_RETRIES:
+                raise
+            delay = 5 * 2 ** attempt
+            print(f"properties/{property_id} out of quota, retrying in {delay}s: {e.message}")
+            time.sleep(delay)
+            continue
+        log_quota(property_id, response.property_quota)
+        return response
+
+def report_pages(property_id, start_date, end_date, page_size=REPORT_PAGE_SIZE, client=None):
+    """Yields the report rows one page at a time, following limit/offset until every row is read."""
+    client = client or get_client()
+
+    offset = 0
+    while True:
+        request = RunReportRequest(
+            property=f"properties/{property_id}",
+            dimensions=[
+                Dimension(name="sessionDefaultChannelGroup"),
+                Dimension(name="date"),
+                Dimension(name="sessionSource"),
+            ],
+            metrics=[
+                Metric(name="sessions"),
+                Metric(name="addToCarts"),
+                Metric(name="checkouts"),
+                Metric(name="transactions"),
+                Metric(name="totalRevenue")
+            ],
+            date_ranges=[DateRange(start_date=start_date, end_date=end_date)],
+            # A fixed row order so limit/offset pages neither skip nor repeat rows
+            order_bys=[
+                OrderBy(dimension=OrderBy.DimensionOrderBy(dimension_name="date")),
+                OrderBy(dimension=OrderBy.DimensionOrderBy(dimension_name="sessionDefaultChannelGroup")),
+                OrderBy(dimension=OrderBy.DimensionOrderBy(dimension_name="sessionSource")),
+            ],
+            limit=page_size,
+            offset=offset,
+            return_property_quota=True,
+        )
+        response = request_report(client, property_id, request)
+
+        rows = []
+        for x in response.rows:
+            dimension_values = [dim.value for dim in x.dimension_values]
+            # Extract metric values
+            metric_values = [met.value for met in x.metric_values]
+            # Combine into a tuple
+            result_tuple = tuple(dimension_values + metric_values)
+            rows.append(result_tuple)
+
+        if rows:
+            yield rows
+
+        offset += len(rows)
+        if not rows or offset >= response.row_count:
+            break
+
+def last_channel_date(client, DB_PATH):
+    """Returns the latest channel_date loaded for the client, or None if nothing is loaded."""
+    conn = connect(DB_PATH)
+    try:
+        return conn.execute(f"SELECT MAX(channel_date) FROM {client}_google_analytics").fetchone()[0]
+    finally:
+        conn.close()
+
+# Channel source rules, checked in order. The first rule whose channel is part of the
+# channel group wins, then the first source text found in the session source, else the default.
+# Channel groups that match no rule get an empty source.
+CHANNEL_RULES = [
+    {"channel": "email", "sources": [["klaviyo", "klaviyo"], ["shopify", "shopify"]], "default": "other"},
+    {"channel": "referral", "sources": [], "default": "other"},
+    {"channel": "unassigned", "sources": [], "default": "unknown"},
+    {"channel": "cross-network", "sources": [["google", "google"]], "default": "other"},
+    {"channel": "direct", "sources": [], "default": "direct"},
+    {"channel": "affiliates", "sources": [], "default": "affiliates"},
+    {"channel": "display", "sources": [["google", "google"]], "default": "other"},
+    {"channel": "organic social", "sources": [["facebook", "facebook"], ["instagram", "instagram"], ["pinterest", "pinterest"], ["reddit", "reddit"]], "default": "other"},
+    {"channel": "organic search", "sources": [["google", "google"], ["bing", "bing"], ["yahoo", "yahoo"], ["duckduck", "duckduckgo"]], "default": "other"},
+    {"channel": "organic shopping", "sources": [["igshopping", "igshopping"], ["google", "google"]], "default": "other"},
+    {"channel": "paid social", "sources": [["facebook", "facebook"], ["fb", "facebook"], ["pinterest", "pinterest"]], "default": "other"},
+    {"channel": "paid search", "sources": [["bing", "bing"], ["google", "google"]], "default": "other"},
+    {"channel": "paid shopping", "sources": [["bing", "bing"], ["google", "google"]], "default": "other"},
+    {"channel": "paid video", "sources": [["bing", "bing"], ["google", "google"]], "default": "other"},
+    {"channel": "paid other", "sources": [], "default": "paid other"},
+    {"channel": "organic video", "sources": [["youtube", "youtube"]], "default": "other"},
+]
+
+def load_channel_rules(path):
+    """Reads channel rules from a json file in the CHANNEL_RULES format."""
+    with open(path) as f:
+        return json.load(f)
+
+def compile_channel_rules(rules):
+    """Returns a classify(channel, source) function for the rules.
+
+    Channel groups seen in the rules are resolved once into a dict, others are
+    matched in rule order. Results are cached per (channel, source) pair since
+    reports repeat the same few pairs on every day, up to CLASSIFY_CACHE_SIZE.
+    """
+    compiled = [
+        (rule["channel"].lower(), [(text.lower(), source) for text, source in rule["sources"]], rule["default"])
+        for rule in rules
+    ]
+
+    def match_channel(channel):
+        for rule_channel, sources, default in compiled:
+            if rule_channel in channel:
+                return sources, default
+        return None
+
+    by_channel = {rule_channel: match_channel(rule_channel) for rule_channel, _, _ in compiled}
+
+    @lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+    def classify(channel, source):
+        channel = channel.lower()
+        rule = by_channel[channel] if channel in by_channel else match_channel(channel)
+        if rule is None:
+            return ''
+
+        sources, default = rule
+        source = source.lower()
+        for text, channel_source in sources:
+            if text in source:
+                return channel_source
+        return default
+
+    return classify
+
+classify_source = compile_channel_rules(CHANNEL_RULES)
+
+def clean_source(row, classify=classify_source):
+    return classify(row[0], row[2])
+
+def clean_channels(channels, classify=classify_source):
     clean_channels_list = []
 
     for row in channels:
         channel_name = row[0]  # TEXT
         channel_date = clean_date(row[1])  # DATE
-        channel_source = clean_source(row)  # TEXT
+        channel_source = classify(row[0], row[2])  # TEXT
         channel_sessions = int(row[3])  # NUMERIC
         channel_carts = int(row[4])  # NUMERIC
         channel_checkouts = int(row[5])  # NUMERIC
@@ -217,23 +238,15 @@ def load_channels(clean_data, DB_PATH, client):
         channel_revenue = excluded.channel_revenue;
     """
     try:
-        # Connect to the SQLite database
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-
-        # Insert data in bulk using executemany
-        cur.executemany(INSERT_QUERY, clean_data)
-
-        # Commit changes
-        conn.commit()
+        with writer(DB_PATH) as conn:
+            # Insert data in bulk using executemany, committed as one transaction
+            with conn:
+                conn.executemany(INSERT_QUERY, clean_data)
+                refresh_daily_channels(conn, client, [row[1] for row in clean_data])
+                bump_data_version(conn, client)
         print("Google Channels Loaded")
 
     except Exception as e:
         print(f"An error occurred: {e}")
-
-    finally:
-        # Close the cursor and connection
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+        # Stop the sync, incremental mode restarts from the latest loaded date and would skip this page.
+        raise
@@ -1,67 +1,101 @@
 from klaviyo_api import KlaviyoAPI
 import os
-import json, time
-from klaviyo_mods import clean_campaigns, get_campaign_ids, get_k, load_email_campaigns, match_results
+import json
+from datetime import datetime, timedelta, timezone
+from klaviyo_rate import rate_limiter
+from klaviyo_mods import STORE_TIMEZONE, campaign_filter, clean_campaigns, get_campaign_ids, get_k, load_email_campaigns, match_results
+from shop_db import client_db_path, get_sync_state, get_checkpoint, checkpoint_row, set_sync_state
 
 clients = [] # account prefix that will identify each client database tables ("d1","d2","d3",etc.)
 
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-for client in clients:
+DB_PATH = 'shop.db'
+
+campaign_start = "2024-01-01" # pull campaigns scheduled since this date
+
+# "full" re-pulls every campaign since campaign_start and refreshes all of their stats.
+# "incremental" only pulls campaigns scheduled since the last sync or inside the attribution window,
+# older rows in {client}_klaviyo_campaigns are left as they are (falls back to campaign_start on the first run).
+sync_mode = "full"
+
+ATTRIBUTION_DAYS = 30 # stats of campaigns sent in the last ATTRIBUTION_DAYS are still changing
+
+WATERMARK_KEY = "klaviyo_campaigns_synced_on" # date of the last finished sync
+CHECKPOINT_KEY = "klaviyo_campaigns_cursor" # links.next of the last loaded page, saved so a failed sync resumes
+
+REPORT_BATCH_SIZE = 100 # campaign ids per Reporting API call, the most contains-any accepts
+
+
+def sync_campaigns(client):
     shop_creds_path = os.path.join(base_dir, 'creds', f"{client}_klaviyo.json")
 
     with open(shop_creds_path, 'r') as f:
         creds = json.load(f)
 
-    DB_PATH = 'shop.db'
+    db_path = client_db_path(client, DB_PATH)
+
+    store_tz = creds.get('timezone', STORE_TIMEZONE) # send dates are stored in the store's local time
 
-    klaviyo = KlaviyoAPI(creds['api_key'],max_delay=60,max_retries=3,test_host=None)
+    # Retries are handled by rate_limiter so they respect Klaviyo's Retry-After
+    klaviyo = KlaviyoAPI(creds['api_key'],max_delay=60,max_retries=0,test_host=None)
 
     # Date is passed through filters
-    filters = "and(equals(messages.channel,'email'),equals(status,'Sent'),greater-or-equal(scheduled_at,2024-01-01T00:00:00Z))"
+    synced_on = datetime.now(timezone.utc).date()
+    since = campaign_start
+    if sync_mode == "incremental":
+        watermark = get_sync_state(client, WATERMARK_KEY, db_path)
+        if watermark != None:
+            since = min(watermark, str(synced_on - timedelta(days=ATTRIBUTION_DAYS)))
+        print(f"{client} syncing campaigns scheduled since {since}")
+    filters = campaign_filter(since)
     fields_campaign_message = ['content.subject','content.preview_text']
 
-    # Make first api call to campaigns
-    campaigns = klaviyo.Campaigns.get_campaigns(filter=filters,fields_campaign_message=fields_campaign_message,include=["campaign-messages"])
+    # Resume from the last committed page if the previous run stopped early
+    link = get_checkpoint(client, CHECKPOINT_KEY, filters, db_path)
+    if link != None:
+        print(f"{client} resuming from the last committed page")
+
+    count = 0
+    flag = True
+    pending = [] # (cursor of the page it came from, campaign) waiting for its stats
 
-    camps = clean_campaigns(campaigns) # Loads campaign data into a tuple
-    camp_ids = get_campaign_ids(camps) # Creates a list of campaign ids to get the stats
-    kpis = get_k(camp_ids,creds) # Gets the stats for this set of campaigns
-    matched_results = match_results(camps,kpis)
-    print("Campaign IDs: ",len(camp_ids))
-    print("Matched IDs: ",len(matched_results))
+    while flag:
+        page_cursor = link
+        campaigns = rate_limiter.call(creds['api_key'], "get_campaigns", klaviyo.Campaigns.get_campaigns, filter=filters,fields_campaign_message=fields_campaign_message,include=["campaign-messages"],page_cursor=link)
+        camps = clean_campaigns(campaigns, store_tz) # Loads campaign data into a tuple
+        pending.extend((page_cursor, camp) for camp in camps)
+        print("Campaign IDs: ",len(camps))
 
-    load_email_campaigns(matched_results,DB_PATH,client) # Loads campaigns into database and ignores if it already exists
+        # next page of results
+        link = campaigns['links']['next']
+        if link == None:
+            flag = False
+        if len(camps) == 0:
+            flag = False
 
-    # next page of results
-    link = campaigns['links']['next']
-    flag = False
-    count = 1
+        # Report calls have the tightest limit, so stats are requested for full batches collected across pages
+        while len(pending) >= REPORT_BATCH_SIZE or (pending and not flag):
+            batch = [camp for _, camp in pending[:REPORT_BATCH_SIZE]]
+            pending = pending[REPORT_BATCH_SIZE:]
+            camp_ids = get_campaign_ids(batch) # Creates a list of campaign ids to get the stats
+            kpis = get_k(camp_ids,creds,klaviyo) # Gets the stats for this set of campaigns
+            matched_results = match_results(batch,kpis)
+            print("Matched IDs: ",len(matched_results))
 
-    if link != None:
-        flag = True
-        print(count)
-        time.sleep(30)
+            # Saved with every batch: the oldest page that still has campaigns waiting, or the next page once none are
+            resume_cursor = pending[0][0] if pending else (link if flag else None)
+            load_email_campaigns(matched_results,db_path,client,[checkpoint_row(CHECKPOINT_KEY, filters, resume_cursor)])
 
-    while flag:
-        campaigns = klaviyo.Campaigns.get_campaigns(filter=filters,fields_campaign_message=fields_campaign_message,include=["campaign-messages"],page_cursor=link)
-        camps = clean_campaigns(campaigns)
-        camp_ids = get_campaign_ids(camps)
-        kpis = get_k(camp_ids,creds)
-        matched_results = match_results(camps,kpis)
-        print("Campaign IDs: ",len(camp_ids))
-        print("Matched IDs: ",len(matched_results))
-        load_email_campaigns(matched_results,DB_PATH,client)
-        link = campaigns['links']['next']
         count += 1
         print(count)
         print()
-        
-        if link == None:
-            flag = False
-        if len(matched_results) == 0:
-            flag = False
-        time.sleep(30)
 
+    set_sync_state(client, CHECKPOINT_KEY, None, db_path)
+    set_sync_state(client, WATERMARK_KEY, str(synced_on), db_path)
     print(f"{client} email campaigns done loading.\n")
-    time.sleep(30)
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    for client in clients:
+        sync_campaigns(client)
@@ -1,36 +1,37 @@
 from klaviyo_api import KlaviyoAPI
-from datetime import datetime
-import pytz
-import sqlite3
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from klaviyo_rate import rate_limiter
+from shop_db import writer, sync_state_query, bump_data_version
+from rollups import refresh_daily_email
 
-def clean_time(created_date):
-    dt = datetime.fromisoformat(created_date)
-    formatted_date = dt.strftime('%Y-%m-%dT%H:%M:%SZ')
-    utc = pytz.utc
-    central = pytz.timezone("US/Central")
-    order_created_date = datetime.strptime(formatted_date, "%Y-%m-%dT%H:%M:%SZ")
-    utc_time = utc.localize(order_created_date)
-    central_time = utc_time.astimezone(central)
+STORE_TIMEZONE = "US/Central" # default when the client's _klaviyo.json has no "timezone"
 
-    return central_time
 
+def clean_time(created_date, tz=STORE_TIMEZONE):
+    """Converts a Klaviyo UTC timestamp to the store timezone."""
+    dt = datetime.fromisoformat(created_date.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(ZoneInfo(tz))
 
-def clean_campaigns(campaigns):
+
+def campaign_filter(since):
+    """Sent email campaigns scheduled on or after the since date (YYYY-MM-DD)."""
+    return f"and(equals(messages.channel,'email'),equals(status,'Sent'),greater-or-equal(scheduled_at,{since}T00:00:00Z))"
+
+
+def clean_campaigns(campaigns, tz=STORE_TIMEZONE):
     cleaned = []
-    for i in range(len(campaigns['data'])):
-        camp_name = campaigns['data'][i]['attributes']['name']
-        camp_id = campaigns['data'][i]['id']
-        camp_msg_id = campaigns['data'][i]['relationships']['campaign-messages']['data'][0]['id']
-        camp_subject_line = campaigns['included'][i]['attributes']['content']['subject']
-        camp_preview_text = campaigns['included'][i]['attributes']['content']['preview_text']
-        created_at = clean_time(campaigns['data'][i]['attributes']['created_at']).strftime("%Y-%m-%d %H:%M:%S %Z")
-        send_time = clean_time(campaigns['data'][i]['attributes']['send_time']).strftime("%Y-%m-%d")
+    for camp, message in zip(campaigns['data'], campaigns['included']):
+        content = message['attributes']['content']
+        send_time = clean_time(camp['attributes']['send_time'], tz).strftime("%Y-%m-%d")
 
         cleaned.append((
-            camp_id,
-            camp_name,
-            camp_subject_line,
-            camp_preview_text,
+            camp['id'],
+            camp['attributes']['name'],
+            content['subject'],
+            content['preview_text'],
             send_time
         ))
 
@@ -59,8 +60,10 @@ def get_campaign_ids(campaigns):
     return [camp[0] for camp in campaigns]
 
 
-def get_k(camps, creds):
-    klaviyo_kpis = KlaviyoAPI(creds['api_key'], max_delay=60, max_retries=3)
+def get_k(camps, creds, klaviyo_kpis=None):
+    """Gets the stats for a list of campaign ids. Pass a KlaviyoAPI client to reuse it across calls."""
+    if klaviyo_kpis is None:
+        klaviyo_kpis = KlaviyoAPI(creds['api_key'], max_delay=60, max_retries=0)
     c_ids = ','.join(f'"{c_id}"' for c_id in camps)
     filters = f'contains-any(campaign_id,[{c_ids}])'
     statistics = ["unsubscribes", "clicks_unique", "conversions", "delivered", "recipients", "bounced", "opens_unique", "spam_complaints"]
@@ -77,13 +80,12 @@ def get_k(camps, creds):
         }
     }
 
-    stats = klaviyo_kpis.Reporting.query_campaign_values(body)
+    stats = rate_limiter.call(creds['api_key'], "query_campaign_values", klaviyo_kpis.Reporting.query_campaign_values, body)
     return get_kpis(stats.data.attributes.results)
 
 
-def load_email_campaigns(rows, db_path, client):
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
+def load_email_campaigns(rows, db_path, client, sync_state=()):
+    """Loads campaign rows, sync_state rows are written in the same transaction."""
 
     INSERT_QUERY = f"""
     INSERT INTO {client}_klaviyo_campaigns (
@@ -101,6 +103,7 @@ def load_email_campaigns(rows, db_path, client):
         spam_complaints
     ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ON CONFLICT(campaign_id) DO UPDATE SET
+        delivered_emails = excluded.delivered_emails,
         opens = excluded.opens,
         clicks = excluded.clicks,
         conversions = excluded.conversions,
@@ -110,21 +113,20 @@ def load_email_campaigns(rows, db_path, client):
     """
 
     try:
-        cur.executemany(INSERT_QUERY, rows)
-        conn.commit()
+        with writer(db_path) as conn:
+            with conn:
+                conn.executemany(INSERT_QUERY, rows)
+                refresh_daily_email(conn, client, [row[4] for row in rows])
+                bump_data_version(conn, client)
+                conn.executemany(sync_state_query(client), sync_state)
         print("Klaviyo Campaigns Loaded")
     except Exception as e:
         print(f"An error occurred: {e}")
-    finally:
-        cur.close()
-        conn.close()
+        # Stop here so the saved cursor still points at this page.
+        raise
 
 
 def match_results(camp_list, kpi_list):
-    matched_result = [
-        (*a, *b[1:])
-        for a in camp_list
-        for b in kpi_list
-        if a[0] == b[0]
-    ]
-    return matched_result
+    """Joins campaigns to their stats by campaign id, campaigns without stats are dropped."""
+    kpis = {kpi[0]: kpi[1:] for kpi in kpi_list}
+    return [(*camp, *kpis[camp[0]]) for camp in camp_list if camp[0] in kpis]
@@ -0,0 +1,83 @@
+import threading
+import time
+from openapi_client.exceptions import ApiException
+
+# Klaviyo rate limits per endpoint: (burst per second, steady per minute).
+# https://developers.klaviyo.com/en/docs/rate_limits_and_error_handling
+ENDPOINT_LIMITS = {
+    "get_campaigns": (10, 150),        # M tier
+    "get_metrics": (10, 150),          # M tier
+    "query_campaign_values": (1, 2),   # Reporting API (also capped at 225 per day)
+}
+
+RETRY_STATUS = {429, 503, 504, 524}
+
+
+class TokenBucket:
+    def __init__(self, capacity, per_second):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Takes a token and returns how long to wait before using it."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.per_second
+
+
+class RateLimiter:
+    """Schedules Klaviyo calls against each endpoint's burst and steady limits.
+
+    Budgets are kept per (api key, endpoint), so clients and threads that
+    share an api key share its budget. A 429 pauses that endpoint for the
+    Retry-After the response asks for before the call is retried.
+    """
+
+    def __init__(self, limits=ENDPOINT_LIMITS, max_retries=3):
+        self.limits = limits
+        self.max_retries = max_retries
+        self.buckets = {}
+        self.paused_until = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, api_key, endpoint):
+        """Blocks until a call to endpoint fits the budget for api_key."""
+        key = (api_key, endpoint)
+        with self.lock:
+            if key not in self.buckets:
+                burst, steady = self.limits[endpoint]
+                self.buckets[key] = (TokenBucket(burst, burst), TokenBucket(steady, steady / 60))
+            delay = max(bucket.reserve() for bucket in self.buckets[key])
+            delay = max(delay, self.paused_until.get(key, 0) - time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, api_key, endpoint, seconds):
+        with self.lock:
+            key = (api_key, endpoint)
+            self.paused_until[key] = max(self.paused_until.get(key, 0), time.monotonic() + seconds)
+
+    def call(self, api_key, endpoint, func, *args, **kwargs):
+        """Calls func once the budget allows, retrying rate limited and unavailable responses."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(api_key, endpoint)
+            try:
+                return func(*args, **kwargs)
+            except ApiException as e:
+                if e.status not in RETRY_STATUS or attempt == self.max_retries:
+                    raise
+                headers = e.headers or {}
+                retry_after = headers.get('Retry-After') or headers.get('RateLimit-Reset')
+                retry_after = float(retry_after) if retry_after else 2 ** attempt
+                print(f"Klaviyo {endpoint} returned {e.status}, retrying in {retry_after:.0f}s")
+                self.pause(api_key, endpoint, retry_after)
+
+
+# Shared by every client in this process.
+rate_limiter = RateLimiter()
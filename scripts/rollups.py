@@ -0,0 +1,123 @@
+import json
+
+# Daily summary tables kept next to the raw tables, so reports read one row per day
+# instead of scanning every order, session and campaign. Loaders call the refresh
+# functions in the same transaction as their rows, only for the days they touched.
+# Pass days=None to rebuild a whole table. {client}_customer_summary keeps one row per
+# customer the same way, daily new_customers is counted from its first_order_date.
+
+# customer_id clean_page gives orders without a customer. All guest orders share it,
+# so it is left out of the customer summary and the new customer counts.
+GUEST_CUSTOMER_ID = "1"
+
+
+def days_filter(column, values):
+    """WHERE clause matching column against a list of days (or ids), nothing for None."""
+    if values is None:
+        return "", ()
+    # Compared as text, guest orders carry the integer customer id 1
+    return f"WHERE {column} IN (SELECT value FROM json_each(?))", (json.dumps(sorted({str(value) for value in values})),)
+
+
+def refresh_daily_orders(conn, client, days=None):
+    """Recomputes {client}_daily_orders for the given order dates."""
+    where, params = days_filter("order_date", days)
+    conn.execute(f"DELETE FROM {client}_daily_orders {where}", params)
+
+    where, params = days_filter("O.order_date", days)
+    conn.execute(f"""
+    INSERT INTO {client}_daily_orders (
+        order_date, total_orders, total_sales, total_discounts,
+        total_shipping, total_cost, new_customers)
+    SELECT
+        O.order_date,
+        COUNT(O.order_id),
+        SUM(O.order_total),
+        SUM(O.order_discounts),
+        SUM(O.order_shipping),
+        SUM(O.order_cost),
+        (SELECT COUNT(*) FROM {client}_customer_summary S WHERE S.first_order_date = O.order_date)
+    FROM {client}_orders O
+    {where}
+    GROUP BY O.order_date""", params)
+
+
+def summary_customer_ids(orders):
+    """Customer ids of an orders page that have a {client}_customer_summary row, guest orders have none."""
+    return [row[9] for row in orders if row[9] is not None and str(row[9]) != GUEST_CUSTOMER_ID]
+
+
+def refresh_customer_summary(conn, client, customer_ids=None):
+    """Recomputes {client}_customer_summary for the given customers (see summary_customer_ids)."""
+    if customer_ids is None:
+        conn.execute(f"DELETE FROM {client}_customer_summary")
+        where, params = "WHERE customer_id IS NOT NULL AND customer_id <> ?", (GUEST_CUSTOMER_ID,)
+    else:
+        where, params = days_filter("customer_id", customer_ids)
+        conn.execute(f"DELETE FROM {client}_customer_summary {where}", params)
+    conn.execute(f"""
+    INSERT INTO {client}_customer_summary (
+        customer_id, first_order_date, last_order_date, order_count, lifetime_revenue)
+    SELECT
+        customer_id,
+        MIN(order_date),
+        MAX(order_date),
+        COUNT(order_id),
+        SUM(order_total)
+    FROM {client}_orders
+    {where}
+    GROUP BY customer_id""", params)
+
+
+def first_order_days(conn, client, customer_ids):
+    """First order dates saved for these customers. Loading an earlier order moves their
+    first order to another day, so that day's new_customers has to be refreshed too."""
+    where, params = days_filter("customer_id", customer_ids)
+    rows = conn.execute(f"SELECT first_order_date FROM {client}_customer_summary {where}", params)
+    return [row[0] for row in rows]
+
+
+def refresh_daily_channels(conn, client, days=None):
+    """Recomputes {client}_daily_channels for the given channel dates."""
+    where, params = days_filter("channel_date", days)
+    conn.execute(f"DELETE FROM {client}_daily_channels {where}", params)
+    conn.execute(f"""
+    INSERT INTO {client}_daily_channels (
+        channel_date, channel_name, channel_sessions, channel_carts,
+        channel_checkouts, channel_transactions, channel_revenue)
+    SELECT
+        channel_date,
+        channel_name,
+        SUM(channel_sessions),
+        SUM(channel_carts),
+        SUM(channel_checkouts),
+        SUM(channel_transactions),
+        SUM(channel_revenue)
+    FROM {client}_google_analytics
+    {where}
+    GROUP BY channel_date, channel_name""", params)
+
+
+def refresh_daily_email(conn, client, days=None):
+    """Recomputes {client}_daily_email for the given send dates."""
+    where, params = days_filter("sent_date", days)
+    conn.execute(f"DELETE FROM {client}_daily_email {where}", params)
+
+    where, params = days_filter("sent_time", days)
+    conn.execute(f"""
+    INSERT INTO {client}_daily_email (
+        sent_date, total_campaigns, delivered_emails, opens, clicks,
+        conversions, unsubscribes, bounced, spam_complaints)
+    SELECT
+        sent_time,
+        COUNT(campaign_id),
+        SUM(delivered_emails),
+        SUM(opens),
+        SUM(clicks),
+        SUM(conversions),
+        SUM(unsubscribes),
+        SUM(bounced),
+        SUM(spam_complaints)
+    FROM {client}_klaviyo_campaigns
+    {where}
+    GROUP BY sent_time""", params)
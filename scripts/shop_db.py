@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# "shared" keeps every client's tables in shop.db. "per_client" keeps each client's
+# tables in its own file next to shop.db ({client}.db), so clients load in parallel
+# and can be vacuumed, backed up or moved on their own. Table names keep the
+# {client}_ prefix in both layouts. The chat app (shoppi/shop_db.py) reads the layout from here.
+DB_LAYOUT = "shared"
+
+# Set on every connection. In WAL mode the chat app keeps reading while a sync
+# writes, and synchronous=NORMAL is still safe because WAL commits are atomic.
+PRAGMAS = [
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",    # 64 MB page cache
+    "PRAGMA mmap_size = 268435456",  # read up to 256 MB through memory mapping
+    "PRAGMA temp_store = MEMORY",
+]
+
+# SQLite allows one writer per database file. Loaders hold that file's lock while
+# they write, so concurrent syncs queue up here instead of failing with "database is locked".
+write_locks = {}
+writers = {}
+writers_lock = threading.Lock()
+
+
+def client_db_path(client, db_path='shop.db'):
+    """Returns the database file holding the client's tables for DB_LAYOUT."""
+    if DB_LAYOUT == "per_client":
+        return os.path.join(os.path.dirname(db_path), f"{client.lower()}.db")
+    return db_path
+
+
+def connect(db_path='shop.db', check_same_thread=True):
+    """Opens a connection with PRAGMAS applied."""
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_write_lock(db_path='shop.db'):
+    with writers_lock:
+        if db_path not in write_locks:
+            write_locks[db_path] = threading.Lock()
+        return write_locks[db_path]
+
+
+@contextmanager
+def writer(db_path='shop.db'):
+    """Holds the file's write lock and yields the one connection every loader in this process writes it through."""
+    with get_write_lock(db_path):
+        if db_path not in writers:
+            writers[db_path] = connect(db_path, check_same_thread=False)
+        yield writers[db_path]
+
+
+def execute_rows(conn, client, table_name, query, rows):
+    """Runs query for all rows, falling back to one row at a time if the batch fails.
+
+    Rows SQLite still rejects are saved to {client}_quarantine instead of
+    dropping the rest of the batch. Returns the number of quarantined rows.
+    Call inside a transaction, a failed statement only undoes its own row.
+    """
+    try:
+        conn.executemany(query, rows)
+        return 0
+    except sqlite3.Error as e:
+        print(f"SQLite Error: {e}, retrying {table_name} row by row")
+
+    quarantined = []
+    for row in rows:
+        try:
+            conn.execute(query, row)
+        except sqlite3.Error as e:
+            quarantined.append((table_name, json.dumps(row, default=str), str(e), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    if quarantined:
+        conn.executemany(f"""
+        INSERT INTO {client}_quarantine (table_name, row_data, error, quarantined_at)
+        VALUES (?, ?, ?, ?)""", quarantined)
+        print(f"{len(quarantined)} {table_name} rows quarantined")
+    return len(quarantined)
+
+
+# Sync state
+def sync_state_query(client):
+    return f"""
+    INSERT INTO {client}_sync_state (sync_key, sync_value)
+    VALUES (?, ?)
+    ON CONFLICT(sync_key) DO UPDATE SET
+        sync_value = excluded.sync_value"""
+
+# Counter the chat app checks before reusing a cached query result (see shoppi/shop_db.py).
+DATA_VERSION_KEY = "data_version"
+
+def bump_data_version(conn, client):
+    """Increments the client's data version. Call in the transaction that changes the client's tables."""
+    conn.execute(f"""
+    INSERT INTO {client}_sync_state (sync_key, sync_value)
+    VALUES (?, 1)
+    ON CONFLICT(sync_key) DO UPDATE SET
+        sync_value = sync_value + 1""", (DATA_VERSION_KEY,))
+
+def get_sync_state(client, sync_key, db_path='shop.db'):
+    """Returns the stored value for sync_key, or None if it was never set."""
+    conn = connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT sync_value FROM {client}_sync_state WHERE sync_key = ?", (sync_key,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+        conn.close()
+
+def set_sync_state(client, sync_key, sync_value, db_path='shop.db'):
+    with writer(db_path) as conn:
+        with conn:
+            conn.execute(sync_state_query(client), (sync_key, sync_value))
+
+
+# Pagination checkpoints
+def checkpoint_row(sync_key, scope, cursor):
+    """Sync state row saving the cursor of the next page. A False/None cursor clears the checkpoint.
+
+    `scope` identifies the sync (its filter), a checkpoint is only resumed by the same sync.
+    """
+    if not cursor:
+        return (sync_key, None)
+    return (sync_key, json.dumps({'scope': scope, 'cursor': cursor}))
+
+def get_checkpoint(client, sync_key, scope, db_path='shop.db'):
+    """Returns the saved cursor to resume from, or None to start from the first page."""
+    value = get_sync_state(client, sync_key, db_path)
+    if value is None:
+        return None
+    checkpoint = json.loads(value)
+    if checkpoint['scope'] != scope:
+        return None
+    return checkpoint['cursor']
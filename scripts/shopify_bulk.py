@@ -0,0 +1,121 @@
+import json
+import time
+from urllib.request import urlopen
+from shopify_loaders import querygql
+
+
+bulk_mutation = '''
+mutation {
+  bulkOperationRunQuery(
+    query: """
+BULK_QUERY
+    """
+  ) {
+    bulkOperation {
+      id
+      status
+    }
+    userErrors {
+      field
+      message
+    }
+  }
+}
+'''.strip()
+
+bulk_status = """
+{
+  currentBulkOperation {
+    id
+    status
+    errorCode
+    objectCount
+    url
+  }
+}
+""".strip()
+
+
+def bulk_query(order_filter):
+    """Turns querygql into a bulk query. Bulk operations page on their own, so page sizes and pageInfo are dropped."""
+    query = querygql.replace("ORDER_FILTER", order_filter)
+    query = query.replace("XXREMOVEXX", "")
+    query = query.replace("   first: ORDERS_FIRST\n", "")
+    query = query.replace("lineItems(first: LINE_ITEMS_FIRST)", "lineItems")
+    while "pageInfo {" in query:
+        page_info = query.rindex("\n", 0, query.index("pageInfo {")) + 1
+        page_info_end = query.index("}", page_info) + 1
+        query = query[:page_info] + query[page_info_end + 1:]
+    return query
+
+
+def start_bulk_operation(execute, order_filter):
+    """Submits the order query as a bulk operation. `execute` takes a query string and returns the parsed response."""
+    query = bulk_mutation.replace("BULK_QUERY", bulk_query(order_filter))
+    result = execute(query)
+    run = result['data']['bulkOperationRunQuery']
+    if run['userErrors']:
+        raise RuntimeError(f"Bulk operation rejected: {run['userErrors']}")
+    return run['bulkOperation']['id']
+
+
+def wait_for_bulk_operation(execute, interval=10):
+    """Polls the running bulk operation and returns its result url (None when no orders matched)."""
+    while True:
+        operation = execute(bulk_status)['data']['currentBulkOperation']
+        status = operation['status']
+        if status == "COMPLETED":
+            print(f"Bulk operation finished with {operation['objectCount']} objects")
+            return operation['url']
+        if status in ("FAILED", "CANCELED", "EXPIRED"):
+            raise RuntimeError(f"Bulk operation {status.lower()}: {operation['errorCode']}")
+        time.sleep(interval)
+
+
+def read_bulk_file(url):
+    """Streams the JSONL result one line at a time."""
+    with urlopen(url) as response:
+        for line in response:
+            if line.strip():
+                yield line
+
+
+def stream_bulk_orders(lines):
+    """Rebuilds order edges from bulk JSONL lines in the same shape as a paged orders query.
+
+    Line items are written as their own lines with a __parentId and follow
+    their order, so an order is complete once the next order starts. Line
+    items whose order is not the current one cannot be attached any more,
+    they are counted and reported instead of being dropped silently.
+    """
+    order = None
+    orphans = 0 # a running count only, keeping ids would grow with the file
+    for line in lines:
+        row = json.loads(line)
+        parent_id = row.pop('__parentId', None)
+        if parent_id is None:
+            if order is not None:
+                yield order
+            row['lineItems'] = {'edges': []}
+            order = {'node': row}
+        elif order is not None and order['node']['id'] == parent_id:
+            order['node']['lineItems']['edges'].append({'node': row})
+        else:
+            orphans += 1
+    if order is not None:
+        yield order
+
+    if orphans:
+        print(f"Warning: {orphans} bulk line items were not loaded, their order was not the one before them in the file")
+
+
+def batched(orders, batch_size):
+    """Groups streamed orders into lists of batch_size."""
+    batch = []
+    for order in orders:
+        batch.append(order)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
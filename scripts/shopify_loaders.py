@@ -1,13 +1,9 @@
-import sqlite3
-from datetime import datetime
+from datetime import date, timedelta
+from shop_db import writer, sync_state_query, execute_rows, bump_data_version
+from rollups import refresh_customer_summary, refresh_daily_orders, first_order_days, summary_customer_ids
 
 
 # Utility functions
-def clean_time(created_date):
-    dt = datetime.fromisoformat(created_date.replace('Z', '+00:00'))
-    sqlite_string = dt.strftime('%Y-%m-%d')
-    return sqlite_string
-
 def next_page(page_info):
     """Check if there is a next set of results. Returns True or False"""
     if page_info['hasNextPage'] == True:
@@ -16,19 +12,52 @@ def next_page(page_info):
     else:
         return False
 
-def return_line_item_total(line_items):
-    """Returns a dictionary containing total quanties and total cost."""
-    total_cost = 0
-    for node in line_items:
-        item = node['node']
-        quantity = item['quantity']
-        try:
-            cost = float(item['variant']['inventoryItem']['unitCost']['amount'])
-        except:
-            cost = 0.0
-        total = quantity * cost
-        total_cost += total
-    return total_cost
+def build_query(order_filter, end_cursor=False, orders_first=250, line_items_first=250):
+    """Fills the order filter, page cursor and page sizes into querygql."""
+    query = querygql.replace("ORDER_FILTER", order_filter)
+    query = query.replace("XXREMOVEXX", end_cursor or "")
+    query = query.replace("ORDERS_FIRST", str(orders_first))
+    query = query.replace("LINE_ITEMS_FIRST", str(line_items_first))
+    return query
+
+def build_line_items_query(pending, line_items_first):
+    """Builds one query fetching the next line items page for each (order gid, line items cursor) in pending."""
+    aliases = []
+    for i, (order_id, cursor) in enumerate(pending):
+        alias = lineitemsgql.replace("ORDER_ALIAS", f"order{i}")
+        alias = alias.replace("ORDER_ID", order_id)
+        alias = alias.replace("LINE_ITEMS_CURSOR", cursor)
+        aliases.append(alias.replace("LINE_ITEMS_FIRST", str(line_items_first)))
+    return "{" + "".join(aliases) + "}"
+
+def range_filter(query_start, query_end):
+    """Order filter for orders created between two dates."""
+    order_filter = created_filter.replace("DATE_ORDER_START", query_start)
+    return order_filter.replace("DATE_ORDER_END", query_end)
+
+def updated_filter(watermark):
+    """Order filter for orders updated at or after the watermark."""
+    return f"updated_at:>='{watermark}'"
+
+def shard_ranges(query_start, query_end, shard_size="month"):
+    """Splits query_start..query_end into (start, end) windows of a calendar month or a week."""
+    start = date.fromisoformat(query_start)
+    end = date.fromisoformat(query_end)
+    shards = []
+    while start < end:
+        if shard_size == "week":
+            shard_end = start + timedelta(days=7)
+        else:
+            shard_end = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        shard_end = min(shard_end, end)
+        shards.append((str(start), str(shard_end)))
+        start = shard_end
+    return shards
+
+def page_watermark(orders):
+    """Returns the latest updatedAt on the page, or None for an empty page."""
+    updated = [order['node']['updatedAt'] for order in orders]
+    return max(updated) if updated else None
 
 def check_sku(node):
     sku = node['sku']
@@ -50,187 +79,203 @@ def clean_tags(tags):
         return clean
 
 # Data cleaning functions
-def clean_orders(orders):
-    clean_nodes = []
-    for order in orders:
-        n = order['node']
-        order_created_date = clean_time(n['processedAt'])
-        order_id = n['id'].split("/")[-1]
-        order_name = n['name']
-        sales_channel_source = n['sourceName']
-        order_tags = clean_tags(n['tags'])
-        order_total = round(float(n['totalPriceSet']['shopMoney']['amount']), 2)
-        order_cost = round(return_line_item_total(n['lineItems']['edges']), 2)
-        order_discounts = round(float(n['totalDiscountsSet']['shopMoney']['amount']), 2)
-        order_shipping = round(float(n['totalShippingPriceSet']['shopMoney']['amount']), 2)
-
-        customer = n['customer']
+def gid_tail(gid):
+    """Returns the numeric part of a Shopify gid."""
+    return gid[gid.rfind("/") + 1:]
 
-        try:
-            customer_name = customer['displayName']
-            customer_id = customer['id'].split("/")[-1]
-
-        except:
-            customer_name = "N/A"
-            customer_id = 1  
+def clean_page(orders):
+    """Cleans orders, customers and line items in a single pass over the page.
 
-        cleaned_row = (
-            order_id, order_created_date, order_name, order_total, order_cost,
-            order_tags, order_discounts, order_shipping,
-            sales_channel_source, customer_id, customer_name
-        )
-        clean_nodes.append(cleaned_row)
-    return clean_nodes
-
-def clean_customers(orders):
-    """Clean daily customers info and returns a list of tuples."""
-
-    clean_nodes = []
+    Returns (orders, customers, line_items) rows for the orders, customers
+    and line_items tables. Customers are deduplicated by customer_id,
+    keeping the last row seen.
+    """
+    order_rows = []
+    customer_rows = {}
+    line_rows = []
 
     for order in orders:
         n = order['node']
+        order_id = gid_tail(n['id'])
+        order_name = n['name']
         customer = n['customer']
 
-        try:
+        if customer is not None:
+            customer_id = gid_tail(customer['id'])
             customer_name = customer['displayName']
-            customer_id = customer['id'].split("/")[-1]
-            customer_email = customer['email']
-            customer_tags = clean_tags(customer['tags'])
-        except:
-            customer_name = "N/A"
+            line_customer_id = customer_id
+            address = customer['defaultAddress'] or {}
+            customer_rows[customer_id] = (
+                customer_id, customer_name, customer['email'], address.get('city'),
+                address.get('provinceCode'), address.get('countryCodeV2'), address.get('province'),
+                address.get('country'), clean_tags(customer['tags'])
+            )
+        else:
             customer_id = 1
-            customer_email = None
-            customer_tags = None
-        
-        try:
-            address = customer['defaultAddress']
-            customer_city = address['city']
-            country_name = address['country']
-            country_code = address['countryCodeV2']
-            state_province_name = address['province']
-            state_province_code = address['provinceCode']
-        except:
-            customer_city = None
-            country_name = None
-            country_code = None
-            state_province_name = None
-            state_province_code = None
-
-        cleaned_row = (
-            customer_id, customer_name, customer_email, customer_city,
-            state_province_code, country_code, state_province_name,
-            country_name, customer_tags
-        )
-        clean_nodes.append(cleaned_row)
-    return clean_nodes
-
-def clean_line_items(orders):
-    """Clean line items and returns a list of tuples."""
-    clean_nodes = []
-
-    for order in orders:
-        n = order['node']
-        order_id = n['id'].split("/")[-1]
-        order_name = n['name']
-        customer = n['customer']
-
-        try:
-            customer_id = customer['id'].split("/")[-1]
-        except:
-            customer_id = None
-
-        line_items = n['lineItems']['edges']
+            customer_name = "N/A"
+            line_customer_id = None
+            customer_rows[1] = (1, "N/A", None, None, None, None, None, None, None)
 
-        for line_item in line_items:
+        order_cost = 0.0
+        for line_item in n['lineItems']['edges']:
             line = line_item['node']
-            line_id = line['id'].split("/")[-1]
+            line_quantity = int(line['quantity'])
 
-            try:
-                product = line['product']
-                product_id = product['id'].split("/")[-1]
+            product = line['product']
+            if product is not None:
+                product_id = gid_tail(product['id'])
                 product_tags = clean_tags(product['tags'])
                 product_vendor = product['vendor']
-            except:
+            else:
                 product_id = None
                 product_tags = None
                 product_vendor = None
 
-            line_quantity = int(line['quantity'])
-            line_sku = check_sku(line)
-            line_title = line['title']
-
-            try:
-                line_cost = float(line['variant']['inventoryItem']['unitCost']['amount'])
-            except:
-                line_cost = None
-            
-            try:
-                line_msrp = float(line['originalUnitPriceSet']['shopMoney']['amount'])
-            except:
-                line_msrp = None
+            variant = line['variant']
+            inventory_item = variant['inventoryItem'] if variant else None
+            unit_cost = inventory_item['unitCost'] if inventory_item else None
+            line_cost = float(unit_cost['amount']) if unit_cost else None
+            order_cost += line['quantity'] * (line_cost or 0.0)
 
+            msrp_set = line['originalUnitPriceSet']
+            line_msrp = float(msrp_set['shopMoney']['amount']) if msrp_set else None
             line_discount = float(line['totalDiscountSet']['shopMoney']['amount'])
-            line_unit_price = round((line_msrp * line_quantity - line_discount)/line_quantity,2)
-            line_unit_discount = round(line_discount/line_quantity,2)
 
-            cleaned_row = (
-                line_id, order_id, order_name, customer_id, line_sku, line_title,
-                product_vendor, line_quantity, line_unit_price, line_cost,
-                line_unit_discount, product_id, product_tags
-            )
-            clean_nodes.append(cleaned_row)
-    return clean_nodes
+            line_rows.append((
+                gid_tail(line['id']), order_id, order_name, line_customer_id, check_sku(line), line['title'],
+                product_vendor, line_quantity, round((line_msrp * line_quantity - line_discount)/line_quantity,2),
+                line_cost, round(line_discount/line_quantity,2), product_id, product_tags
+            ))
 
+        order_rows.append((
+            order_id, n['processedAt'][:10], order_name,
+            round(float(n['totalPriceSet']['shopMoney']['amount']), 2), round(order_cost, 2),
+            clean_tags(n['tags']), round(float(n['totalDiscountsSet']['shopMoney']['amount']), 2),
+            round(float(n['totalShippingPriceSet']['shopMoney']['amount']), 2),
+            n['sourceName'], customer_id, customer_name
+        ))
 
-# Load data functions
-def insert_data(query, data):
-    conn = sqlite3.connect('shop.db') # Database name
-    cursor = conn.cursor()
-    try:
-        cursor.executemany(query, data)
-        conn.commit()
-        print("Data Loaded Successfully")
-    except sqlite3.Error as e:
-        print(f"SQLite Error: {e}")
-    finally:
-        cursor.close()
-        conn.close()
+    return order_rows, list(customer_rows.values()), line_rows
 
-# Load orders
-def load_orders(clean_data, client):
-    insert_query = f"""
+
+# Load data functions
+def orders_query(client):
+    return f"""
     INSERT INTO {client}_orders (
         order_id, order_date, order_name, order_total, order_cost,
         order_tags, order_discounts, order_shipping, sales_channel_source,
         customer_id, customer_name)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
-    insert_data(insert_query, clean_data)
-
-# Load customers
-def load_customers(clean_data, client):
-    insert_query = f"""
-    INSERT OR IGNORE INTO {client}_customers (
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(order_id) DO UPDATE SET
+        order_date = excluded.order_date,
+        order_name = excluded.order_name,
+        order_total = excluded.order_total,
+        order_cost = excluded.order_cost,
+        order_tags = excluded.order_tags,
+        order_discounts = excluded.order_discounts,
+        order_shipping = excluded.order_shipping,
+        sales_channel_source = excluded.sales_channel_source,
+        customer_id = excluded.customer_id,
+        customer_name = excluded.customer_name"""
+
+def customers_query(client):
+    return f"""
+    INSERT INTO {client}_customers (
         customer_id, customer_name, customer_email, customer_city,
         customer_state_code, customer_country_code, customer_state_name,
         customer_country_name, customer_tags)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
-    insert_data(insert_query, clean_data)
-
-# Load line items
-def load_line_items(clean_data, client):
-    insert_query = f"""
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(customer_id) DO UPDATE SET
+        customer_name = excluded.customer_name,
+        customer_email = excluded.customer_email,
+        customer_city = excluded.customer_city,
+        customer_state_code = excluded.customer_state_code,
+        customer_country_code = excluded.customer_country_code,
+        customer_state_name = excluded.customer_state_name,
+        customer_country_name = excluded.customer_country_name,
+        customer_tags = excluded.customer_tags"""
+
+def line_items_query(client):
+    return f"""
     INSERT INTO {client}_line_items (
         line_item_id, order_id, order_name, customer_id, product_sku,
         product_title, product_vendor, ordered_quantity, product_price,
         product_cost, product_discount, product_id, product_tags)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
-    insert_data(insert_query, clean_data)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(line_item_id) DO UPDATE SET
+        order_name = excluded.order_name,
+        customer_id = excluded.customer_id,
+        product_sku = excluded.product_sku,
+        product_title = excluded.product_title,
+        product_vendor = excluded.product_vendor,
+        ordered_quantity = excluded.ordered_quantity,
+        product_price = excluded.product_price,
+        product_cost = excluded.product_cost,
+        product_discount = excluded.product_discount,
+        product_id = excluded.product_id,
+        product_tags = excluded.product_tags"""
+
+# Load a full page
+def commit_page(client, orders, customers, line_items, sync_state=(), db_path='shop.db'):
+    """Writes a page of orders, customers and line items together with its sync state rows in one transaction."""
+    with writer(db_path) as conn:
+        with conn:
+            # Days whose first time customers can change, read before the new orders land
+            customer_ids = summary_customer_ids(orders)
+            first_days = first_order_days(conn, client, customer_ids)
+
+            execute_rows(conn, client, 'orders', orders_query(client), orders)
+            execute_rows(conn, client, 'customers', customers_query(client), customers)
+            execute_rows(conn, client, 'line_items', line_items_query(client), line_items)
+            if orders:
+                refresh_customer_summary(conn, client, customer_ids)
+                refresh_daily_orders(conn, client, [row[1] for row in orders] + first_days)
+            bump_data_version(conn, client)
+            conn.executemany(sync_state_query(client), sync_state)
+        print("Page Loaded Successfully")
+
+created_filter = "created_at:>='DATE_ORDER_STARTT00:00:00-06:00' AND created_at:<='DATE_ORDER_ENDT00:00:00-06:00'"
+
+line_item_fields = """
+              product {
+                id
+                tags
+                vendor
+              }
+              id
+              sku
+              quantity
+              title
+              customAttributes {
+                key
+                value
+              }
+              originalUnitPriceSet {
+                shopMoney {
+                  amount
+                }
+              }
+              totalDiscountSet {
+                shopMoney {
+                  amount
+                }
+              }
+              variant {
+                price
+                inventoryItem {
+                  unitCost {
+                    amount
+                  }
+                }
+              }
+""".strip("\n")
 
 querygql = """
 {
   orders(
-   first: 250
-   query: "created_at:>='DATE_ORDER_STARTT00:00:00-06:00' AND created_at:<='DATE_ORDER_ENDT00:00:00-06:00'"
+   first: ORDERS_FIRST
+   query: "ORDER_FILTER"
+   sortKey: UPDATED_AT
    XXREMOVEXX
    ) {
     edges {
@@ -257,42 +302,16 @@ querygql = """
             amount
           }
         }
-        lineItems(first: 250) {
+        lineItems(first: LINE_ITEMS_FIRST) {
           edges {
             node {
-              product {
-                id
-                tags
-                vendor
-              }
-              id
-              sku
-              quantity
-              title
-              customAttributes {
-                key
-                value
-              }
-              originalUnitPriceSet {
-                shopMoney {
-                  amount
-                }
-              }
-              totalDiscountSet {
-                shopMoney {
-                  amount
-                }
-              }
-              variant {
-                price
-                inventoryItem {
-                  unitCost {
-                    amount
-                  }
-                }
-              }
+LINE_ITEM_FIELDS
             }
           }
+          pageInfo {
+            hasNextPage
+            endCursor
+          }
         }
         customer {
           id
@@ -315,4 +334,25 @@ querygql = """
     }
   }
 }
-""".strip()
\ No newline at end of file
+""".strip()
+querygql = querygql.replace("LINE_ITEM_FIELDS", line_item_fields)
+
+# Follow-up query for orders with more line items than the first page held.
+# One copy is made per pending order with ORDER_ALIAS, ORDER_ID and the cursor filled in, then
+# the copies are joined into one query (see build_line_items_query).
+lineitemsgql = """
+  ORDER_ALIAS: order(id: "ORDER_ID") {
+    id
+    lineItems(first: LINE_ITEMS_FIRST, after: "LINE_ITEMS_CURSOR") {
+      edges {
+        node {
+LINE_ITEM_FIELDS
+        }
+      }
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+    }
+  }
+""".replace("LINE_ITEM_FIELDS", line_item_fields)
@@ -1,16 +1,30 @@
 import shopify
 import json
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from shopify_loaders import (
+    build_query,
+    build_line_items_query,
+    range_filter,
+    shard_ranges,
+    updated_filter,
+    page_watermark,
     next_page,
-    clean_orders,
-    clean_customers,
-    clean_line_items,
-    load_orders,
-    load_customers,
-    load_line_items,
-    querygql
+    clean_page,
+    commit_page
 )
+from shop_db import client_db_path, get_sync_state, get_checkpoint, checkpoint_row
+from shopify_bulk import (
+    start_bulk_operation,
+    wait_for_bulk_operation,
+    read_bulk_file,
+    stream_bulk_orders,
+    batched
+)
+from shopify_throttle import ThrottleController
 from pprint import pprint
 
 
@@ -19,14 +33,38 @@ clients = [] # account prefix that will identify each client database tables ("d
 query_start = "2024-01-01"  # start with this date
 query_end = "2025-01-01"    # up to but not including this date
 
+# "range" re-pulls every order created between query_start and query_end.
+# "incremental" only pulls orders updated since the last sync (falls back to query_start on the first run).
+# "bulk" runs the query_start/query_end range as a Shopify bulk operation, best for large backfills.
+# "sharded" splits the query_start/query_end range into SHARD_SIZE windows and pages through them concurrently.
+sync_mode = "range"
+
+SHARD_SIZE = "month" # "month" or "week"
+SHARD_WORKERS = 4    # shards fetched at the same time, they share the store's query cost bucket
+
+# Overlap fetching the next page with cleaning and loading the current one.
+pipeline = True
+PIPELINE_DEPTH = 4 # fetched pages allowed to wait for the database writer
+
+# Orders are fetched with a small first page of line items, the rest is fetched
+# in follow-up queries only for orders that have more.
+LINE_ITEMS_FIRST_PAGE = 5
+FOLLOWUP_BATCH = 5 # orders per follow-up line items query
+
+BULK_BATCH_SIZE = 5000 # orders cleaned and loaded per batch in bulk mode
+
+WATERMARK_KEY = "shopify_orders_updated_at"
+CHECKPOINT_KEY = "shopify_orders_cursor" # cursor of the next page, saved with each page so a failed sync resumes
 
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 DB_PATH = 'shop.db'
 
-for client in clients:
+
+def activate_session(client):
+    """Activates the client's Shopify session for the current thread."""
     shop_creds_path = os.path.join(base_dir, 'creds', f'{client}_shop.json')
-    
+
     with open(shop_creds_path) as f:
         shop_creds = json.load(f)
 
@@ -39,68 +77,223 @@ for client in clients:
     session = shopify.Session(shop_url, api_version, api_token)
     shopify.ShopifyResource.activate_session(session)
 
-    # FIRST CALL
-    query = querygql.replace("XXREMOVEXX","")
-    query = query.replace("DATE_ORDER_START",query_start)
-    query = query.replace("DATE_ORDER_END",query_end)
-    result = shopify.GraphQL().execute(query)
-    result = json.loads(result)
-
-    orders_result = result['data']['orders']['edges']
-    page_info = result['data']['orders']['pageInfo']
-    query_cost = result['extensions']['cost']
-    end_cursor = next_page(page_info)
-
-    # CLEAN ORDERS
-    orders = clean_orders(orders_result)
-    customers = clean_customers(orders_result)
-    line_items = clean_line_items(orders_result)
-
-    # INSERT FIRST RESULTS
-
-    if len(orders) > 0:
-        load_orders(orders,client)
-        load_customers(customers,client)
-        load_line_items(line_items,client)
+
+def sync_orders(client):
+    activate_session(client)
+
+    # Pages are committed through the shared writer connection, one transaction each.
+    db_path = client_db_path(client, DB_PATH)
+    if sync_mode == "bulk":
+        sync_orders_bulk(client, range_filter(query_start, query_end), db_path)
+    elif sync_mode == "sharded":
+        sync_orders_sharded(client, db_path)
     else:
-        print("No orders to process")
+        sync_orders_paged(client, db_path)
+
+
+def sync_orders_paged(client, db_path):
+    if sync_mode == "incremental":
+        watermark = get_sync_state(client, WATERMARK_KEY, db_path) or f"{query_start}T00:00:00Z"
+        order_filter = updated_filter(watermark)
+        print(f"{client} syncing orders updated since {watermark}")
+    else:
+        order_filter = range_filter(query_start, query_end)
 
-    # SET COUNTER
-    page = 1
-    print(page)
-    pprint(query_cost)
+    resume_cursor = get_checkpoint(client, CHECKPOINT_KEY, order_filter, db_path)
+    if resume_cursor:
+        print(f"{client} resuming from the last committed page")
 
-    # NEXT PAGE CALLS
-    flag = True
-    if end_cursor == False:
-        flag = False
+    def load(page):
+        orders_result, end_cursor = page
+        load_page(client, orders_result, [checkpoint_row(CHECKPOINT_KEY, order_filter, end_cursor)], db_path)
 
-    # LOOP TRHOUGH ALL PAGES
-    while flag:
-        query = querygql.replace("XXREMOVEXX",end_cursor)
-        query = query.replace("DATE_ORDER_START",query_start)
-        query = query.replace("DATE_ORDER_END",query_end)
-        result = shopify.GraphQL().execute(query)
-        result = json.loads(result)
+    # LOOP THROUGH ALL PAGES
+    started = time.perf_counter()
+    pages = fetch_pages(order_filter, resume_cursor or False)
+    if pipeline:
+        page_count = load_pipelined(pages, load)
+    else:
+        page_count = 0
+        for page in pages:
+            load(page)
+            page_count += 1
+    elapsed = time.perf_counter() - started
+
+    print(f"{client} orders done loading. {page_count} pages in {elapsed:.1f}s ({page_count / elapsed:.2f} pages/s)\n")
+
+
+def fetch_pages(order_filter, end_cursor=False, throttle=None):
+    """Yields (orders, cursor of the next page) for each page, following the cursor chain."""
+    throttle = throttle or ThrottleController(line_items_max=LINE_ITEMS_FIRST_PAGE)
+    followup_throttle = ThrottleController(orders_max=FOLLOWUP_BATCH, orders_min=FOLLOWUP_BATCH)
+    page = 0
+    while True:
+        result = throttle.execute(
+            execute_gql,
+            lambda orders_first, line_items_first: build_query(order_filter, end_cursor, orders_first, line_items_first)
+        )
 
         orders_result = result['data']['orders']['edges']
         page_info = result['data']['orders']['pageInfo']
         query_cost = result['extensions']['cost']
-
         end_cursor = next_page(page_info)
-        orders = clean_orders(orders_result)
-        customers = clean_customers(orders_result)
-        line_items = clean_line_items(orders_result)
+        complete_line_items(orders_result, followup_throttle)
 
         page += 1
-        print(page)
+        print(f"{page} ({throttle.orders_first} orders x {throttle.line_items_first} line items)")
         pprint(query_cost)
         print()
 
+        yield orders_result, end_cursor
+
         if end_cursor == False:
-            flag = False
+            break
+
+
+def complete_line_items(orders_result, throttle):
+    """Fetches the remaining line items for orders whose first line items page was not the last."""
+    orders_by_id = {order['node']['id']: order['node'] for order in orders_result}
+    pending = [
+        (order_id, node['lineItems']['pageInfo']['endCursor'])
+        for order_id, node in orders_by_id.items()
+        if node['lineItems']['pageInfo']['hasNextPage']
+    ]
+
+    queries = 0
+    while pending:
+        batch = []
+
+        def build(orders_first, line_items_first):
+            batch[:] = pending[:orders_first]
+            return build_line_items_query(batch, line_items_first), len(batch)
+
+        result = throttle.execute(execute_gql, build)
+        pending = pending[len(batch):]
+        queries += 1
+
+        for i in range(len(batch)):
+            order = result['data'][f"order{i}"]
+            if order is None:
+                continue
+            line_items = order['lineItems']
+            orders_by_id[order['id']]['lineItems']['edges'].extend(line_items['edges'])
+            if line_items['pageInfo']['hasNextPage']:
+                pending.append((order['id'], line_items['pageInfo']['endCursor']))
+
+    if queries:
+        print(f"{queries} follow-up line item queries")
+
+
+def load_page(client, orders_result, sync_state=(), db_path=DB_PATH):
+    """Cleans a page and commits its rows together with the sync state rows."""
+    sync_state = list(sync_state)
+    if len(orders_result) == 0:
+        print("No orders to process")
+
+    # Pages are sorted by updatedAt, so everything up to here is loaded.
+    elif sync_mode == "incremental":
+        sync_state.append((WATERMARK_KEY, page_watermark(orders_result)))
+
+    orders, customers, line_items = clean_page(orders_result)
+    commit_page(client, orders, customers, line_items, sync_state, db_path)
+
+
+def load_pipelined(pages, load, depth=None):
+    """Runs load on a single writer thread while the next page is fetched.
+
+    At most `depth` fetched pages wait in the queue, so memory stays capped.
+    Returns the number of pages loaded.
+    """
+    page_queue = queue.Queue(maxsize=depth or PIPELINE_DEPTH)
+    errors = []
+
+    def writer():
+        while True:
+            orders_result = page_queue.get()
+            if orders_result is None:
+                return
+            if not errors:
+                try:
+                    load(orders_result)
+                except Exception as e:
+                    errors.append(e)
+
+    thread = threading.Thread(target=writer, name="shop-db-writer")
+    thread.start()
+    page_count = 0
+    try:
+        for orders_result in pages:
+            if errors:
+                break
+            page_queue.put(orders_result)
+            page_count += 1
+    finally:
+        page_queue.put(None)
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return page_count
+
+
+def sync_orders_sharded(client, db_path):
+    """Backfills query_start..query_end as date shards paged in parallel.
+
+    Each shard keeps its own cursor checkpoint, so a failed backfill only
+    re-fetches unfinished shards. Shard boundaries overlap by one instant,
+    the upserts make the duplicate harmless.
+    """
+    shards = shard_ranges(query_start, query_end, SHARD_SIZE)
+    throttle = ThrottleController(line_items_max=LINE_ITEMS_FIRST_PAGE)
+
+    def sync_shard(shard):
+        shard_start, shard_end = shard
+        activate_session(client)
+        order_filter = range_filter(shard_start, shard_end)
+        checkpoint_key = f"{CHECKPOINT_KEY}:{shard_start}"
+
+        resume_cursor = get_checkpoint(client, checkpoint_key, order_filter, db_path)
+        page_count = 0
+        for orders_result, end_cursor in fetch_pages(order_filter, resume_cursor or False, throttle):
+            load_page(client, orders_result, [checkpoint_row(checkpoint_key, order_filter, end_cursor)], db_path)
+            page_count += 1
+        print(f"{client} shard {shard_start} to {shard_end} done, {page_count} pages")
+        return page_count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SHARD_WORKERS) as executor:
+        page_count = sum(executor.map(sync_shard, shards))
+    elapsed = time.perf_counter() - started
+
+    print(f"{client} orders done loading. {len(shards)} shards, {page_count} pages in {elapsed:.1f}s ({page_count / elapsed:.2f} pages/s)\n")
+
+
+def execute_gql(query):
+    return json.loads(shopify.GraphQL().execute(query))
+
+
+def sync_orders_bulk(client, order_filter, db_path):
+    start_bulk_operation(execute_gql, order_filter)
+    url = wait_for_bulk_operation(execute_gql)
+
+    if url is None:
+        print("No orders to process")
+        return
+
+    started = time.perf_counter()
+    batches = batched(stream_bulk_orders(read_bulk_file(url)), BULK_BATCH_SIZE)
+    if pipeline:
+        batch_count = load_pipelined(batches, lambda orders_result: load_page(client, orders_result, db_path=db_path))
+    else:
+        batch_count = 0
+        for orders_result in batches:
+            load_page(client, orders_result, db_path=db_path)
+            batch_count += 1
+    elapsed = time.perf_counter() - started
+
+    print(f"{client} orders done loading. {batch_count} batches in {elapsed:.1f}s ({batch_count / elapsed:.2f} batches/s)\n")
+
 
-        load_orders(orders,client)
-        load_customers(customers,client)
-        load_line_items(line_items,client)
-    print(f"{client} orders done loading.\n")
\ No newline at end of file
+if __name__ == "__main__":
+    for client in clients:
+        sync_orders(client)
@@ -0,0 +1,134 @@
+import threading
+import time
+
+
+# Rough GraphQL cost of one order node and one line item node in querygql
+# (each object field costs 1, each connection costs 2 plus its nodes).
+# Only the ratio matters, ThrottleController scales it to the requestedQueryCost Shopify reports.
+ORDER_NODE_COST = 11
+LINE_ITEM_NODE_COST = 10
+
+
+def estimate_cost(orders_first, line_items_first):
+    return 2 + orders_first * (ORDER_NODE_COST + line_items_first * LINE_ITEM_NODE_COST)
+
+
+def is_throttled(result):
+    errors = result.get('errors') or []
+    return any((error.get('extensions') or {}).get('code') == "THROTTLED" for error in errors)
+
+
+class ThrottleController:
+    """Paces GraphQL order queries against the cost bucket in extensions.cost.
+
+    Each response updates the bucket state (currentlyAvailable, restoreRate)
+    and the cost of the last query, requests wait until the bucket has
+    restored enough for the next page, and throttled pages are retried.
+    Page sizes are tuned to the largest query the bucket can afford.
+    One controller can be shared by threads querying the same store.
+    """
+
+    def __init__(self, orders_max=250, line_items_max=250, orders_min=10, max_query_cost=1000, safety=0.9, max_retries=5):
+        self.orders_max = orders_max
+        self.line_items_max = line_items_max
+        self.orders_min = orders_min
+        self.max_query_cost = max_query_cost
+        self.safety = safety
+        self.max_retries = max_retries
+
+        self.maximum = None
+        self.available = None
+        self.restore_rate = None
+        self.updated = None
+        self.cost_scale = 1.0
+        self.lock = threading.Lock()
+
+        self.tune()
+
+    def budget(self):
+        budget = self.max_query_cost
+        if self.maximum is not None:
+            budget = min(budget, self.maximum)
+        return budget * self.safety
+
+    def expected_cost(self):
+        return estimate_cost(self.orders_first, self.line_items_first) * self.cost_scale
+
+    def tune(self):
+        """Picks the largest page sizes whose expected cost fits the budget."""
+        # Shopify rejects queries over max_query_cost, so a low cost_scale never lets the estimate exceed it.
+        budget = min(self.budget() / self.cost_scale, self.max_query_cost * self.safety)
+
+        # Keep as many line items as possible while still fitting orders_min orders per page.
+        line_items_first = int(((budget - 2) / self.orders_min - ORDER_NODE_COST) // LINE_ITEM_NODE_COST)
+        line_items_first = max(1, min(self.line_items_max, line_items_first))
+
+        per_order = ORDER_NODE_COST + line_items_first * LINE_ITEM_NODE_COST
+        orders_first = int((budget - 2) // per_order)
+
+        self.line_items_first = line_items_first
+        self.orders_first = max(1, min(self.orders_max, orders_first))
+
+    def wait(self):
+        """Sleeps until the bucket has restored enough for the next query, then reserves its cost."""
+        with self.lock:
+            if self.updated is None:
+                return
+            restored = self.available + self.restore_rate * (time.monotonic() - self.updated)
+            available = min(self.maximum, restored)
+            cost = self.expected_cost()
+            if available < cost:
+                delay = (cost - available) / self.restore_rate
+                print(f"Waiting {delay:.1f}s for query cost {cost:.0f} ({available:.0f} available)")
+                time.sleep(delay)
+                available = cost
+            # Other threads sharing the bucket see this query's cost as spent.
+            self.available = available - cost
+            self.updated = time.monotonic()
+
+    def update(self, result, orders_first=None, line_items_first=None):
+        """Reads the bucket state from a response. Pass the page sizes the query was built with."""
+        cost = (result.get('extensions') or {}).get('cost')
+        if not cost:
+            return
+
+        with self.lock:
+            self.update_status(cost, orders_first or self.orders_first, line_items_first or self.line_items_first)
+
+    def update_status(self, cost, orders_first, line_items_first):
+        status = cost['throttleStatus']
+        self.maximum = float(status['maximumAvailable'])
+        self.available = float(status['currentlyAvailable'])
+        self.restore_rate = float(status['restoreRate'])
+        self.updated = time.monotonic()
+
+        requested = cost.get('requestedQueryCost')
+        if requested:
+            self.cost_scale = requested / estimate_cost(orders_first, line_items_first)
+        self.tune()
+
+    def execute(self, execute, build_query):
+        """Runs one page query, retrying while Shopify reports it as throttled.
+
+        `execute` takes a query string and returns the parsed response.
+        `build_query` takes (orders_first, line_items_first) and returns the query,
+        or (query, orders used) when it was built for fewer orders than orders_first,
+        so the reported cost is compared with the query that actually ran.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.wait()
+            orders_first, line_items_first = self.orders_first, self.line_items_first
+            query = build_query(orders_first, line_items_first)
+            if isinstance(query, tuple):
+                query, orders_first = query
+            result = execute(query)
+            self.update(result, orders_first, line_items_first)
+
+            if is_throttled(result):
+                print(f"Throttled, retrying page ({attempt + 1}/{self.max_retries})")
+                continue
+            if result.get('errors'):
+                raise RuntimeError(f"GraphQL error: {result['errors']}")
+            return result
+
+        raise RuntimeError("Still throttled after retries")
@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from shopify_main import sync_orders
+from klaviyo_main import sync_campaigns
+from ga_main import sync_channels
+
+# Runs the Shopify, Klaviyo and GA4 syncs for every client concurrently.
+# Writes to shop.db are serialized by the loaders (see shop_db.py).
+
+clients = [] # account prefix that will identify each client database tables ("d1","d2","d3",etc.)
+
+WORKERS = 8 # syncs running at the same time across all sources
+
+# Max clients syncing at once per source, keeps each API inside its rate limits.
+SOURCE_LIMITS = {
+    "shopify": 4,
+    "klaviyo": 2,
+    "ga": 4,
+}
+
+SOURCES = {
+    "shopify": sync_orders,
+    "klaviyo": sync_campaigns,
+    "ga": sync_channels,
+}
+
+
+def run_sync(source, client, workers):
+    with workers:
+        started = time.perf_counter()
+        SOURCES[source](client)
+        return time.perf_counter() - started
+
+
+def sync_all(clients, sources=None, workers=WORKERS, source_limits=SOURCE_LIMITS):
+    """Syncs every (client, source) pair concurrently and returns the pairs that failed.
+
+    Each source gets its own pool sized by source_limits, and `workers` caps
+    how many syncs run at once across all sources.
+    """
+    sources = sources or list(SOURCES)
+    running = threading.BoundedSemaphore(workers)
+    pools = {source: ThreadPoolExecutor(max_workers=source_limits[source], thread_name_prefix=source) for source in sources}
+    failed = []
+
+    started = time.perf_counter()
+    try:
+        jobs = {
+            pools[source].submit(run_sync, source, client, running): (client, source)
+            for client in clients
+            for source in sources
+        }
+        for job in as_completed(jobs):
+            client, source = jobs[job]
+            try:
+                elapsed = job.result()
+                print(f"{client} {source} sync finished in {elapsed:.1f}s")
+            except Exception as e:
+                print(f"{client} {source} sync failed: {e}")
+                failed.append((client, source))
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+    print(f"{len(jobs)} syncs finished in {time.perf_counter() - started:.1f}s, {len(failed)} failed.")
+    return failed
+
+
+if __name__ == "__main__":
+    sync_all(clients)
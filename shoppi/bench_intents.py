@@ -0,0 +1,45 @@
+import time
+from datetime import date
+from intents import route
+
+# Check and benchmark for the question router in intents.py. Checks the dates and
+# templates picked for common questions, that questions the router can't fully read
+# (including four digit numbers that are not years) go to the model instead of
+# failing, then times route() on a mix of both.
+# Run from the shoppi folder: python bench_intents.py
+
+TODAY = date(2024, 6, 15)
+ROUNDS = 20000
+
+# (domain, question, expected params or None when the model should answer)
+CASES = [
+    ("ecommerce", "How did my store do last month?", ["2024-05-01", "2024-05-31"]),
+    ("ecommerce", "Top selling products in Q1 2024", ["2024-01-01", "2024-03-31"]),
+    ("ecommerce", "New customers in february of 2023", ["2023-02-01", "2023-02-28"]),
+    ("ecommerce", "Sales for 2022", ["2022-01-01", "2022-12-31"]),
+    ("ecommerce", "sales in march", ["2024-03-01", "2024-03-31"]),
+    ("google_analytics", "Traffic by channel last 7 days", ["2024-06-08", "2024-06-15"]),
+    ("email", "What was my open rate this year?", ["2024-01-01", "2024-06-15"]),
+    ("ecommerce", "sales for sku 0000", None),
+    ("ecommerce", "sales in february of 0000", None),
+    ("ecommerce", "sales in q2 0001", None),
+    ("ecommerce", "show me sales for order 9999", None),
+    ("ecommerce", "sales for sku ABC-12 last month", None),
+    ("email", "sales last month", None),
+]
+
+
+for domain, question, expected in CASES:
+    response = route(domain, question, "bench", today=TODAY)
+    params = response["params"] if response else None
+    assert params == expected, (question, params, expected)
+
+start = time.perf_counter()
+for _ in range(ROUNDS // len(CASES)):
+    for domain, question, _expected in CASES:
+        route(domain, question, "bench", today=TODAY)
+elapsed = time.perf_counter() - start
+calls = ROUNDS // len(CASES) * len(CASES)
+
+print(f"{len(CASES)} router cases checked")
+print(f"{calls} questions routed in {elapsed:.2f}s ({elapsed / calls * 1e6:.1f}us per question)")
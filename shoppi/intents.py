@@ -0,0 +1,180 @@
+import calendar
+import re
+from datetime import date, timedelta
+
+# Questions most chats start with (store performance, top products, new customers,
+# channel breakdown, email rates) are answered from fixed SQL templates without
+# asking the model. route() only answers when every word of the question is part of
+# an intent, a date expression or FILLER_WORDS, anything else goes to the model.
+# Dates are passed as parameters, so each template is one statement per client that
+# sqlite3's statement cache keeps compiled.
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+FULL_MONTH_NAMES = "|".join(name.lower() for name in calendar.month_name if name)
+YEAR = r"(?:19|20)\d{2}" # other four digit numbers are skus, order numbers and the like
+
+FILLER_WORDS = set("""
+    a an and are at can could did do does during for from get give got had has have how i
+    in is it many me my of on our over please see show tell the to was we were what whats
+""".split())
+
+
+def month_range(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def last_month(today):
+    return month_range(*((today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)))
+
+
+def recent_month(today, month):
+    """The named month this year, or last year if it has not started yet."""
+    return month_range(today.year if month <= today.month else today.year - 1, month)
+
+
+def quarter_range(year, quarter):
+    return date(year, quarter * 3 - 2, 1), month_range(year, quarter * 3)[1]
+
+
+# (pattern, function(match, today) -> (start, end)), the first pattern found in the question is used
+DATE_RULES = [
+    (r"\b(?:last|past|previous) (\d{1,3}) days\b", lambda m, t: (t - timedelta(days=int(m[1])), t)),
+    (r"\btoday\b", lambda m, t: (t, t)),
+    (r"\byesterday\b", lambda m, t: (t - timedelta(days=1), t - timedelta(days=1))),
+    (r"\b(?:this|current) week\b|\bweek to date\b", lambda m, t: (t - timedelta(days=t.weekday()), t)),
+    (r"\b(?:last|previous) week\b", lambda m, t: (t - timedelta(days=t.weekday() + 7), t - timedelta(days=t.weekday() + 1))),
+    (r"\b(?:this|current) month\b|\bmonth to date\b|\bmtd\b", lambda m, t: (t.replace(day=1), t)),
+    (r"\b(?:last|previous) month\b", lambda m, t: last_month(t)),
+    (r"\b(?:this|current) year\b|\byear to date\b|\bytd\b", lambda m, t: (t.replace(month=1, day=1), t)),
+    (r"\b(?:last|previous) year\b", lambda m, t: (date(t.year - 1, 1, 1), date(t.year - 1, 12, 31))),
+    (rf"\b({MONTH_NAMES})\.?,? (?:of )?({YEAR})\b", lambda m, t: month_range(int(m[2]), MONTHS[m[1]])),
+    (rf"\bq([1-4]),? (?:of )?({YEAR})\b", lambda m, t: quarter_range(int(m[2]), int(m[1]))),
+    (rf"\b(?:the year )?({YEAR})\b", lambda m, t: (date(int(m[1]), 1, 1), date(int(m[1]), 12, 31))),
+    (rf"\b({FULL_MONTH_NAMES})\b", lambda m, t: recent_month(t, MONTHS[m[1]])),
+]
+DATE_RULES = [(re.compile(pattern), period) for pattern, period in DATE_RULES]
+
+
+STORE_PERFORMANCE = """
+    SELECT
+        SUM(total_sales) AS total_revenue,
+        SUM(total_cost) AS total_cost,
+        SUM(total_discounts) AS total_discounts,
+        SUM(total_shipping) AS total_shipping,
+        SUM(total_orders) AS total_orders,
+        SUM(total_sales) / SUM(total_orders) AS avg_order_value
+    FROM {table_id}_daily_orders
+    WHERE order_date BETWEEN ? AND ?;"""
+
+TOP_PRODUCTS = """
+    SELECT li.product_sku, li.product_title, SUM(li.ordered_quantity) AS total_sold
+    FROM {table_id}_line_items AS li
+    JOIN {table_id}_orders AS o ON li.order_id = o.order_id
+    WHERE o.order_date BETWEEN ? AND ?
+    GROUP BY li.product_sku, li.product_title
+    ORDER BY total_sold DESC
+    LIMIT 10;"""
+
+NEW_CUSTOMERS = """
+    SELECT COUNT(*) AS first_time_buyers
+    FROM {table_id}_customer_summary
+    WHERE first_order_date BETWEEN ? AND ?;"""
+
+CHANNEL_BREAKDOWN = """
+    SELECT
+        channel_name,
+        SUM(channel_sessions) AS total_sessions,
+        SUM(channel_carts) AS total_carts,
+        SUM(channel_checkouts) AS total_checkouts,
+        SUM(channel_transactions) AS total_transactions,
+        SUM(channel_revenue) AS total_revenue
+    FROM {table_id}_daily_channels
+    WHERE channel_date BETWEEN ? AND ?
+    GROUP BY channel_name
+    ORDER BY total_sessions DESC;"""
+
+EMAIL_RATE = """
+    SELECT (SUM({metric}) * 100.0 / NULLIF(SUM(delivered_emails), 0)) AS {metric_rate}
+    FROM {{table_id}}_daily_email
+    WHERE sent_date BETWEEN ? AND ?;"""
+
+EMAIL_PERFORMANCE = """
+    SELECT
+        SUM(total_campaigns) AS total_campaigns,
+        SUM(delivered_emails) AS delivered_emails,
+        (SUM(opens) * 100.0 / NULLIF(SUM(delivered_emails), 0)) AS open_rate,
+        (SUM(clicks) * 100.0 / NULLIF(SUM(delivered_emails), 0)) AS click_rate,
+        (SUM(conversions) * 100.0 / NULLIF(SUM(delivered_emails), 0)) AS conversion_rate,
+        SUM(conversions) AS total_conversions
+    FROM {table_id}_daily_email
+    WHERE sent_date BETWEEN ? AND ?;"""
+
+# (domain, pattern, template, column names), checked in order
+INTENTS = [
+    ("ecommerce", r"\b(?:top|best)[ -](?:selling |sold |performing )?(?:products?|items?|skus?|sellers)\b|\bbest ?sellers\b",
+        TOP_PRODUCTS, "product_sku, product_title, total_sold"),
+    ("ecommerce", r"\b(?:first[ -]time|new) (?:customers|buyers)\b",
+        NEW_CUSTOMERS, "first_time_buyers"),
+    ("ecommerce", r"\b(?:store |shop )?(?:performance|sales|revenue)\b|\bhow did (?:my |our |the )?(?:store|shop) do\b",
+        STORE_PERFORMANCE, "total_revenue, total_cost, total_discounts, total_shipping, total_orders, avg_order_value"),
+    ("google_analytics", r"\b(?:website|site|web|traffic|channel) (?:performance|breakdown)\b|\btraffic(?: by channels?)?\b|\bchannels\b",
+        CHANNEL_BREAKDOWN, "channel_name,total_sessions,total_carts,total_checkouts,total_transactions,total_revenue"),
+    ("email", r"\b(?:email )?open rates?\b",
+        EMAIL_RATE.format(metric="opens", metric_rate="open_rate"), "open_rate"),
+    ("email", r"\b(?:email )?(?:click(?: through|-through)? rates?|ctr)\b",
+        EMAIL_RATE.format(metric="clicks", metric_rate="click_rate"), "click_rate"),
+    ("email", r"\b(?:email )?conversion rates?\b",
+        EMAIL_RATE.format(metric="conversions", metric_rate="conversion_rate"), "conversion_rate"),
+    ("email", r"\b(?:email|campaign|klaviyo) performance\b",
+        EMAIL_PERFORMANCE, "total_campaigns, delivered_emails, open_rate, click_rate, conversion_rate, total_conversions"),
+]
+INTENTS = [(domain, re.compile(pattern), template, columns) for domain, pattern, template, columns in INTENTS]
+
+
+def normalize_question(user_input):
+    text = user_input.lower().replace("'", "").replace("’", "")
+    return " ".join(re.sub(r"[^\w\s-]", " ", text).split())
+
+
+def find_period(text, today):
+    """Returns (start, end, text without the date expression), or None if no usable date is given."""
+    for pattern, period in DATE_RULES:
+        match = pattern.search(text)
+        if match:
+            try:
+                start, end = period(match, today)
+            except (ValueError, OverflowError):
+                return None # a date the calendar can't hold, the model answers instead
+            return start, end, text[:match.start()] + " " + text[match.end():]
+    return None
+
+
+def route(domain, user_input, table_id, today=None):
+    """Returns a make_call style response for a recognized question, or None to ask the model.
+
+    The response carries the query, its date parameters and column names.
+    """
+    text = normalize_question(user_input)
+    found = find_period(text, today or date.today())
+    if found is None:
+        return None
+    start, end, text = found
+
+    for intent_domain, pattern, template, columns in INTENTS:
+        if intent_domain != domain:
+            continue
+        match = pattern.search(text)
+        if match is None:
+            continue
+        rest = (text[:match.start()] + " " + text[match.end():]).split()
+        if not set(rest) <= FILLER_WORDS:
+            return None
+        return {
+            "query": template.format(table_id=table_id),
+            "params": [str(start), str(end)],
+            "column_names": columns,
+        }
+    return None
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+LLM_CACHE_TTL = 24 * 60 * 60 # seconds a saved response is reused
+LLM_CACHE_SIZE = 5000 # responses kept, the least recently used are dropped first
+
+
+def normalize_input(user_input):
+    """Lowercases and collapses whitespace, so "Sales this month?" and "sales this month" share a response."""
+    return re.sub(r"\s+", " ", user_input).strip().lower().rstrip("?.! ")
+
+
+def cache_key(sys_prompt, user_input, table_id, day):
+    prompt_hash = hashlib.sha256(sys_prompt.encode()).hexdigest()
+    key = json.dumps([prompt_hash, normalize_input(user_input), table_id, day])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Model responses saved in a local SQLite file, so they are reused across app restarts.
+
+    Responses expire after `ttl` seconds and at most `size` are kept. Keys
+    include the day, so answers to "this month" or "last 30 days" are asked
+    again the next day.
+    """
+
+    def __init__(self, db_path, ttl=LLM_CACHE_TTL, size=LLM_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA busy_timeout = 5000")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT,
+                    created_at REAL,
+                    used_at REAL
+                );""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_used_at_idx ON llm_responses (used_at);")
+
+    def get(self, key):
+        """Returns the saved response for key, or None if there is none or it expired."""
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT response FROM llm_responses WHERE cache_key = ? AND created_at >= ?",
+                (key, now - self.ttl)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE llm_responses SET used_at = ? WHERE cache_key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, response):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO llm_responses (cache_key, response, created_at, used_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    response = excluded.response,
+                    created_at = excluded.created_at,
+                    used_at = excluded.used_at""", (key, json.dumps(response), now, now))
+            self.conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl,))
+            self.conn.execute("""
+                DELETE FROM llm_responses WHERE cache_key IN (
+                    SELECT cache_key FROM llm_responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)""", (self.size,))
+
+    def forget(self, key):
+        """Drops a response, used when the query it returned fails."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (key,))
+
+    def stats(self):
+        with self.lock:
+            size = self.conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "size": size}
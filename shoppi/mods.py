@@ -1,13 +1,22 @@
 from openai import OpenAI
 import streamlit as st
-import json, os, sqlite3
+import json, os
 import pandas as pd
 from datetime import datetime
+from shop_db import ReadPools, ResultCache, rollup_chunks, rollup_connection, rollup_table
+from llm_cache import ResponseCache, cache_key
+from intents import route
 
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 DB_PATH = os.path.join(base_dir, 'shop.db')
 
+read_pools = ReadPools(DB_PATH) # each client's tables are read from the file set by DB_LAYOUT in scripts/shop_db.py
+
+result_cache = ResultCache() # results of call_sql and call_sql_report, result_cache.stats() has hit/miss counts
+
+response_cache = ResponseCache(os.path.join(base_dir, 'llm_cache.db')) # make_call responses, kept across restarts
+
 client = OpenAI(api_key=st.secrets["open_secret"],
                 organization=st.secrets["open_organization"])
 
@@ -17,7 +26,13 @@ open_model = "gpt-4o-mini-2024-07-18"
 def today_date():
     return datetime.now().strftime('%Y-%m-%d')
 
-def make_call(sys_prompt, user_input):
+def make_call(sys_prompt, user_input, table_id=None):
+    """Asks the model for a query, reusing today's response to the same prompt and question."""
+    key = cache_key(sys_prompt, user_input, table_id, today_date())
+    response = response_cache.get(key)
+    if response is not None:
+        return response
+
     chat_completion = client.chat.completions.create(
         messages=[
             {"role": "system", "content": sys_prompt},
@@ -28,33 +43,27 @@ def make_call(sys_prompt, user_input):
         temperature=0.1
     )
     response = json.loads(chat_completion.choices[0].message.content)
+    response_cache.put(key, response)
     return response
 
-def call_sql(gpt_response):
+def forget_call(sys_prompt, user_input, table_id=None):
+    """Drops the saved make_call response, so a query that failed is asked for again."""
+    response_cache.forget(cache_key(sys_prompt, user_input, table_id, today_date()))
+
+def call_sql(gpt_response, table_id):
     gpt_query = gpt_response['query']
-    print(gpt_query) #prints query for debugging
+    params = gpt_response.get('params', ()) # only set on responses from intents.route
+    print(gpt_query, params) #prints query for debugging
     print()
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(gpt_query)
-        query_response = [x for x in cursor.fetchall()]
-        conn.commit()  # commit if there are any changes
-        return query_response
+        with read_pools.connection(table_id) as conn:
+            return result_cache.fetchall(conn, table_id, gpt_query, params)
 
     except Exception as e:
         print(f"Error: {e}")
         return False
 
-    finally:
-        try:
-            cursor.close()
-            conn.close()
-        except Exception:
-            pass
-
-    
 
 def ecommerce_data(user_input,table_id):
     """Pass the user input and their table id and get back an executed query."""
@@ -62,27 +71,30 @@ def ecommerce_data(user_input,table_id):
     today = today_date()
 
     sys_prompt = f"""
-        You will be assisting with generating Python SQLite queries for an e-commerce transaction database. The database has three tables: 
+        You will be assisting with generating Python SQLite queries for an e-commerce transaction database. The database has five tables: 
         - \"{table_id}_orders\"
         - \"{table_id}_customers\"
         - \"{table_id}_line_items\"
+        - \"{table_id}_daily_orders\"
+        - \"{table_id}_customer_summary\"
 
         When asked a specific question or request, respond **only** with the appropriate SQLite query that reads from these tables.
 
         Use the following rules:
 
-        1. **Read-Only**: You have read access to these three tables and **no** access to any other tables. 
-        2. **Refusals**: Refuse any query if it cannot be answered with these three tables.
+        1. **Read-Only**: You have read access to these five tables and **no** access to any other tables. 
+        2. **Refusals**: Refuse any query if it cannot be answered with these five tables.
         3. **Case-Insensitive Filtering**: Use `NOCASE` (i.e., `COLLATE NOCASE`) and `LIKE` where appropriate to ensure case-insensitive, partial-match searching.
         4. **Foreign Key Relationships**: Leverage any relationships (e.g., `order_id`, `customer_id`) using **explicit** JOINs when needed.
         5. **Result Limiting**: If the user input includes the words \"list\", \"show\", or \"who\", limit the query results to 10 rows (e.g., `LIMIT 10`).
         6. **Date Constraints**: 
         - Use today's date of {today} for any \"today\" references.
-        - Use `date(column)` as needed for date comparisons in SQLite.
+        - Dates are stored as YYYY-MM-DD text. Compare date columns directly (e.g. `order_date >= '2024-11-01'`), never wrap the column in `date()`, so the date indexes are used.
         - DO NOT USE CASE with dates.
         7. **Column Names**: Do not alter table or column names (no singular ↔ plural changes).
         8. **Aggregate vs. List**: Assume the user wants total/aggregate values unless they specifically ask for a list or say \"show\" or \"who\" (which also implies a `LIMIT 10`).
-        9. **Output Format**: Your response **must** be in JSON with the structure:
+        9. **Daily Totals**: For store totals by day, month or date range (sales, orders, discounts, shipping, cost, average order value, new customers) that do not filter by product, customer, tag or channel, read `{table_id}_daily_orders` instead of summing `{table_id}_orders`. For first time, repeat or returning customers, cohorts and lifetime value read `{table_id}_customer_summary` instead of searching each customer's order history.
+        10. **Output Format**: Your response **must** be in JSON with the structure:
             ```
             {{
                 "query": "YOUR QUERY HERE",
@@ -132,13 +144,29 @@ def ecommerce_data(user_input,table_id):
         - product_id (TEXT): ID of the product.
         - product_tags (TEXT): Tags for this product (e.g., color, size).
 
+        4. {table_id}_daily_orders (one row per day, kept up to date from {table_id}_orders):
+        - order_date (TEXT PRIMARY KEY): Day (YYYY-MM-DD).
+        - total_orders (INTEGER): Number of orders that day.
+        - total_sales (REAL): Sum of order_total.
+        - total_discounts (REAL): Sum of order_discounts.
+        - total_shipping (REAL): Sum of order_shipping.
+        - total_cost (REAL): Sum of order_cost.
+        - new_customers (INTEGER): Customers whose first ever order was that day.
+
+        5. {table_id}_customer_summary (one row per customer, kept up to date from {table_id}_orders, guest orders without a customer (customer_id 1) are not included):
+        - customer_id (TEXT PRIMARY KEY): References the customer in {table_id}_customers.
+        - first_order_date (TEXT): Date of the customer's first order (YYYY-MM-DD).
+        - last_order_date (TEXT): Date of the customer's latest order (YYYY-MM-DD).
+        - order_count (INTEGER): Number of orders the customer has placed.
+        - lifetime_revenue (REAL): Sum of order_total over all of the customer's orders.
+
         ---
         # Steps
 
         1. Parse the user query.
         2. Determine the necessary filters/conditions.
         3. Apply case-insensitive filters (using LIKE with `COLLATE NOCASE`).
-        4. Use {today} as 'today' if relevant;
+        4. Use {today} as 'today' if relevant, comparing date columns directly;
         5. Limit results to 10 if the user input includes "list", "show", or "who".
         6. Construct and output the final SQLite query.
 
@@ -151,15 +179,15 @@ def ecommerce_data(user_input,table_id):
         {{
         "query": "
             SELECT
-                SUM(order_total) AS total_revenue,
-                SUM(order_cost) AS total_cost,
-                SUM(order_discounts) AS total_discounts,
-                SUM(order_shipping) AS total_shipping,
-                COUNT(order_id) AS total_orders,
-                AVG(order_total) AS avg_order_value
-            FROM {table_id}_orders
-            WHERE date(order_date) >= '2024-11-01'
-            AND date(order_date) < '2024-12-01';
+                SUM(total_sales) AS total_revenue,
+                SUM(total_cost) AS total_cost,
+                SUM(total_discounts) AS total_discounts,
+                SUM(total_shipping) AS total_shipping,
+                SUM(total_orders) AS total_orders,
+                SUM(total_sales) / SUM(total_orders) AS avg_order_value
+            FROM {table_id}_daily_orders
+            WHERE order_date >= '2024-11-01'
+            AND order_date < '2024-12-01';
         ",
         "column_names": "total_revenue, total_cost, total_discounts, total_shipping, total_orders, avg_order_value"
         }}
@@ -176,7 +204,7 @@ def ecommerce_data(user_input,table_id):
             FROM {table_id}_orders AS o
             JOIN {table_id}_customers AS c
                 ON o.customer_id = c.customer_id
-            WHERE date(o.order_date) BETWEEN '2024-01-01' AND '2024-12-31'
+            WHERE o.order_date BETWEEN '2024-01-01' AND '2024-12-31'
             GROUP BY c.customer_id, c.customer_name
             ORDER BY total_spent DESC
             LIMIT 10;
@@ -190,32 +218,43 @@ def ecommerce_data(user_input,table_id):
         {{
         "query": "
         SELECT 
-            COUNT(DISTINCT o.customer_id) AS first_time_buyers
-        FROM {table_id}_orders AS o
-        WHERE date(o.order_date) BETWEEN '2024-05-01' AND '2024-05-31'
-            AND date(o.order_date) = (
-                SELECT MIN(date(o2.order_date))
-                FROM {table_id}_orders AS o2
-                WHERE o2.customer_id = o.customer_id
-            );",
+            COUNT(*) AS first_time_buyers
+        FROM {table_id}_customer_summary
+        WHERE first_order_date BETWEEN '2024-05-01' AND '2024-05-31';",
         "column_names": "first_time_buyers"
         }}
 
+        **User Input**: "What is my repeat customer rate for customers who first ordered in 2024?"
+
+        **Expected JSON Output**:
+        {{
+        "query": "
+        SELECT 
+            COUNT(*) AS customers,
+            SUM(order_count > 1) AS repeat_customers,
+            SUM(order_count > 1) * 100.0 / COUNT(*) AS repeat_rate
+        FROM {table_id}_customer_summary
+        WHERE first_order_date BETWEEN '2024-01-01' AND '2024-12-31';",
+        "column_names": "customers, repeat_customers, repeat_rate"
+        }}
+
         **User Input**: "What were my top selling products in january 2024"
 
         **Expected JSON Output**:
         {{
-        "query": "SELECT li.product_sku, li.product_title, SUM(li.ordered_quantity) AS total_sold FROM {table_id}_line_items AS li JOIN {table_id}_orders AS o ON li.order_id = o.order_id WHERE date(o.order_date) BETWEEN '2024-01-01' AND '2024-01-31' GROUP BY li.product_sku, li.product_title ORDER BY total_sold DESC;",
+        "query": "SELECT li.product_sku, li.product_title, SUM(li.ordered_quantity) AS total_sold FROM {table_id}_line_items AS li JOIN {table_id}_orders AS o ON li.order_id = o.order_id WHERE o.order_date BETWEEN '2024-01-01' AND '2024-01-31' GROUP BY li.product_sku, li.product_title ORDER BY total_sold DESC;",
         "column_names": "product_sku, product_title, total_sold"
         }}
 
 
     """
     
-    response = make_call(sys_prompt,user_input)
-    query_result = call_sql(response)
+    # Common questions are answered from a template without calling the model
+    response = route("ecommerce", user_input, table_id) or make_call(sys_prompt,user_input,table_id)
+    query_result = call_sql(response, table_id)
 
     if query_result == False:
+        forget_call(sys_prompt,user_input,table_id)
         return "Something went wrong. Please refresh your tab and start again."
     
     else:
@@ -232,13 +271,13 @@ def email_data(user_input,table_id):
     today = today_date()
 
     sys_prompt = f"""
-        You will be assisting with generating Python SQLite queries for a database containing Klaviyo email data. This database has only one table: \"{table_id}_klaviyo_campaigns\". You have read-only access to this table—no other tables are available.
+        You will be assisting with generating Python SQLite queries for a database containing Klaviyo email data. This database has two tables: \"{table_id}_klaviyo_campaigns\" and its daily totals \"{table_id}_daily_email\". You have read-only access to these tables—no other tables are available.
 
         Use the following rules when constructing queries:
 
-        1. **Single Table**: Only query \"{table_id}_klaviyo_campaigns\". Refuse if it cannot be answered with this table alone.
+        1. **Two Tables**: Only query \"{table_id}_klaviyo_campaigns\" and \"{table_id}_daily_email\". Refuse if it cannot be answered with these tables. Use \"{table_id}_daily_email\" for totals and rates over a date range, and \"{table_id}_klaviyo_campaigns\" when campaigns, subject lines or preview texts are needed.
         2. **Case-Insensitive Searches**: Apply `LIKE` with `COLLATE NOCASE` where partial text matching is needed.
-        3. **Date Handling**: Today is {today}. Use `DATE('now', '-X day')` if referencing the last X days, or {today} if referencing \"today.\" 
+        3. **Date Handling**: Today is {today}. Use `DATE('now', '-X day')` if referencing the last X days, or {today} if referencing \"today.\" `sent_time` is stored as YYYY-MM-DD, compare it directly (e.g. `sent_time >= DATE('now', '-30 day')`) and never wrap it in `DATE()` so its index is used.
         4. **Limit Results**: If the user input contains \"list,\" \"show,\" or \"who,\" add `LIMIT 10` to the query.
         5. **Naming**: Do not change or pluralize/singularize column names or the user’s text/title cases.
         6. **Aggregate by Default**: Assume the user wants total/aggregated metrics unless they explicitly ask to \"list\" or \"show\" row-level data.
@@ -257,7 +296,7 @@ def email_data(user_input,table_id):
         - `campaign_name` (TEXT): Name of the email campaign.
         - `subject_line` (TEXT): Subject line used in the campaign emails.
         - `preview_text` (TEXT): Preview text shown in inbox.
-        - `sent_time` (TEXT): When the campaign was sent (YYYY-MM-DD HH:MM:SS).
+        - `sent_time` (TEXT): When the campaign was sent (YYYY-MM-DD).
         - `delivered_emails` (INTEGER): Total emails successfully delivered.
         - `opens` (INTEGER): Number of opened emails.
         - `clicks` (INTEGER): Number of link clicks in the emails.
@@ -266,21 +305,26 @@ def email_data(user_input,table_id):
         - `bounced` (INTEGER): Emails that failed delivery.
         - `spam_complaints` (INTEGER): Number of spam complaints.
 
+        TABLE {table_id}_daily_email (one row per send date, kept up to date from {table_id}_klaviyo_campaigns):
+        - `sent_date` (TEXT PRIMARY KEY): Send date (YYYY-MM-DD), compare it directly like `sent_time`.
+        - `total_campaigns` (INTEGER): Campaigns sent that day.
+        - `delivered_emails`, `opens`, `clicks`, `conversions`, `unsubscribes`, `bounced`, `spam_complaints` (INTEGER): Totals of the campaigns sent that day.
+
         # Example Queries
 
         **Input**: "What was my open rate over the last 30 days?"
         **Output**:
         {{
         "query": "SELECT (SUM(opens) * 100.0 / NULLIF(SUM(delivered_emails), 0)) AS open_rate 
-            FROM {table_id}_klaviyo_campaigns 
-            WHERE DATE(sent_time) BETWEEN DATE('now', '-30 day') AND DATE('now');",
+            FROM {table_id}_daily_email 
+            WHERE sent_date BETWEEN DATE('now', '-30 day') AND DATE('now');",
         "column_names": "open_rate"
         }}
 
         **Input**: "What was my conversion rate over the last 30 days?"
         **Output**:
         {{
-        "query": "SELECT (SUM(conversions)*100.0 / NULLIF(SUM(delivered_emails),0)) AS conversion_rate FROM {table_id}_klaviyo_campaigns WHERE DATE(sent_time) >= DATE('now','-30 day');",
+        "query": "SELECT (SUM(conversions)*100.0 / NULLIF(SUM(delivered_emails),0)) AS conversion_rate FROM {table_id}_daily_email WHERE sent_date >= DATE('now','-30 day');",
         "column_names": "conversion_rate"
         }}
 
@@ -292,10 +336,12 @@ def email_data(user_input,table_id):
         }}
         """
     
-    response = make_call(sys_prompt,user_input)
-    query_result = call_sql(response)
+    # Common questions are answered from a template without calling the model
+    response = route("email", user_input, table_id) or make_call(sys_prompt,user_input,table_id)
+    query_result = call_sql(response, table_id)
 
     if query_result == False:
+        forget_call(sys_prompt,user_input,table_id)
         return "Something went wrong. Please refresh your tab and start again."
     
     else:
@@ -346,6 +392,11 @@ def google_analytics(user_input, table_id):
     - channel_revenue (INTEGER): Revenue generated by the channel
     - channel_date (TEXT): Date of recorded web traffic activity (YYYY-MM-DD)
 
+    Table {table_id}_daily_channels has the same totals per day and channel_name (one row per channel_date and channel_name, no channel_source):
+    - channel_date, channel_name, channel_sessions, channel_carts, channel_checkouts, channel_transactions, channel_revenue
+
+    Use {table_id}_daily_channels when the question does not need channel_source, otherwise use {table_id}_google_analytics.
+
     By default, queries should include columns for sessions, carts, checkouts, transactions, and revenue. Always sort results by the calculated or summed `total_sessions` in descending order.
 
     # Steps
@@ -376,8 +427,8 @@ def google_analytics(user_input, table_id):
                     SUM(channel_checkouts) AS total_checkouts, 
                     SUM(channel_transactions) AS total_transactions, 
                     SUM(channel_revenue) AS total_revenue 
-                FROM {table_id}_google_analytics 
-                WHERE DATE(channel_date) BETWEEN '2024-11-01' AND '2024-11-30' 
+                FROM {table_id}_daily_channels 
+                WHERE channel_date BETWEEN '2024-11-01' AND '2024-11-30' 
                 GROUP BY channel_name 
                 ORDER BY total_sessions DESC;",
         "column_names": "channel_name,total_sessions,total_carts,total_checkouts,total_transactions,total_revenue"
@@ -395,7 +446,7 @@ def google_analytics(user_input, table_id):
                     SUM(channel_revenue) AS total_revenue 
                 FROM {table_id}_google_analytics 
                 WHERE LOWER(channel_name) LIKE '%organic social%'
-                    AND DATE(channel_date) BETWEEN '2024-12-01' AND '2024-12-31' 
+                    AND channel_date BETWEEN '2024-12-01' AND '2024-12-31' 
                 GROUP BY channel_source 
                 ORDER BY total_sessions DESC;
                 ",
@@ -415,7 +466,7 @@ def google_analytics(user_input, table_id):
                     SUM(channel_revenue) AS total_revenue 
                 FROM {table_id}_google_analytics 
                 WHERE LOWER(channel_source) LIKE '%facebook%' 
-                    AND DATE(channel_date) BETWEEN '2024-09-01' AND '2024-09-30' 
+                    AND channel_date BETWEEN '2024-09-01' AND '2024-09-30' 
                 GROUP BY channel_name, channel_source 
                 ORDER BY total_sessions DESC;
                 ",
@@ -432,9 +483,9 @@ def google_analytics(user_input, table_id):
                     SUM(channel_checkouts) AS total_checkouts, 
                     SUM(channel_transactions) AS total_transactions, 
                     SUM(channel_revenue) AS total_revenue 
-                FROM {table_id}_google_analytics 
+                FROM {table_id}_daily_channels 
                 WHERE LOWER(channel_name) LIKE '%organic search%' 
-                    AND DATE(channel_date) BETWEEN '2024-07-01' AND '2024-07-31' 
+                    AND channel_date BETWEEN '2024-07-01' AND '2024-07-31' 
                 GROUP BY channel_name 
                 ORDER BY total_sessions DESC;
                 ",
@@ -445,15 +496,15 @@ def google_analytics(user_input, table_id):
     **Output**:
     {{
         "query": "SELECT 
-                    SUBSTR(DATE(channel_date), 1, 7) AS month, 
+                    SUBSTR(channel_date, 1, 7) AS month, 
                     SUM(channel_sessions) AS total_sessions, 
                     SUM(channel_carts) AS total_carts, 
                     SUM(channel_checkouts) AS total_checkouts, 
                     SUM(channel_transactions) AS total_transactions, 
                     SUM(channel_revenue) AS total_revenue 
-                FROM {table_id}_google_analytics 
+                FROM {table_id}_daily_channels 
                 WHERE LOWER(channel_name) LIKE '%organic search%' 
-                    AND DATE(channel_date) BETWEEN '2024-01-01' AND '2024-12-31' 
+                    AND channel_date BETWEEN '2024-01-01' AND '2024-12-31' 
                 GROUP BY month 
                 ORDER BY total_sessions DESC;
                 ",
@@ -462,15 +513,18 @@ def google_analytics(user_input, table_id):
 
     # Notes
 
-    - Ensure each query references only {table_id}_google_analytics.
+    - Ensure each query references only {table_id}_google_analytics or {table_id}_daily_channels.
     - Use `LIKE` and `LOWER(...)` for case-insensitive matching.
     - Always return the final query in valid SQLite syntax, ensuring correct date comparisons.
+    - channel_date is stored as YYYY-MM-DD, compare it directly (e.g. `channel_date BETWEEN '2024-11-01' AND '2024-11-30'`) and never wrap it in `DATE()` so its index is used.
     """
 
-    response = make_call(sys_prompt,user_input)
-    query_result = call_sql(response)
+    # Common questions are answered from a template without calling the model
+    response = route("google_analytics", user_input, table_id) or make_call(sys_prompt,user_input,table_id)
+    query_result = call_sql(response, table_id)
 
     if query_result == False:
+        forget_call(sys_prompt,user_input,table_id)
         return "Something went wrong."
     
     else:
@@ -493,51 +547,37 @@ def email_analytics_summary(user_input,table_id):
     return summery
 
 
-def call_sql_report(query):
+def call_sql_report(query, table_id):
 
     try:
-        conn = sqlite3.connect(DB_PATH)
-        
-        cursor = conn.cursor()
-        cursor.execute(query)
-        
-        query_response = [x for x in cursor.fetchall()]
-        return query_response
-    
+        with read_pools.connection(table_id) as conn:
+            return result_cache.fetchall(conn, table_id, query)
+
     except Exception as e:
         print(f"Error: {e}")
         query_response = False
         return query_response
 
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
-
 def collect_data(table_id,start_date,end_date):
 
+    # Read from the daily summary tables the loaders maintain, one row per day
     shop_status = f"""
         SELECT
-            COUNT(DISTINCT O.ORDER_ID) AS TOTAL_ORDERS,
-            SUM(O.ORDER_TOTAL) AS TOTAL_SALES,
-            SUM(O.ORDER_DISCOUNTS) AS TOTAL_DISCOUNTS,
-            SUM(O.ORDER_SHIPPING) AS TOTAL_SHIPPING,
-            SUM(O.ORDER_COST) AS TOTAL_COST,
-            SUM(O.ORDER_TOTAL) / COUNT(DISTINCT O.ORDER_ID) AS AVERAGE_ORDER_VALUE,
-            (SUM(O.ORDER_TOTAL) - SUM(O.ORDER_COST)) * 1.0 / SUM(O.ORDER_TOTAL) AS MARGIN,
-            COUNT(DISTINCT CASE WHEN C2.CUSTOMER_ID IS NULL THEN O.CUSTOMER_ID END) AS NEW_CUSTOMERS
+            COALESCE(SUM(TOTAL_ORDERS), 0) AS TOTAL_ORDERS,
+            SUM(TOTAL_SALES) AS TOTAL_SALES,
+            SUM(TOTAL_DISCOUNTS) AS TOTAL_DISCOUNTS,
+            SUM(TOTAL_SHIPPING) AS TOTAL_SHIPPING,
+            SUM(TOTAL_COST) AS TOTAL_COST,
+            SUM(TOTAL_SALES) / SUM(TOTAL_ORDERS) AS AVERAGE_ORDER_VALUE,
+            (SUM(TOTAL_SALES) - SUM(TOTAL_COST)) * 1.0 / SUM(TOTAL_SALES) AS MARGIN,
+            COALESCE(SUM(NEW_CUSTOMERS), 0) AS NEW_CUSTOMERS
         FROM
-            {table_id}_ORDERS O
-        LEFT JOIN (
-            SELECT DISTINCT CUSTOMER_ID
-            FROM {table_id}_ORDERS
-            WHERE DATE(ORDER_DATE) < DATE('{start_date}')
-        ) C2 ON O.CUSTOMER_ID = C2.CUSTOMER_ID
+            {table_id}_DAILY_ORDERS
         WHERE
-            DATE(O.ORDER_DATE) BETWEEN DATE('{start_date}') AND DATE('{end_date}');
+            ORDER_DATE BETWEEN DATE('{start_date}') AND DATE('{end_date}');
     """
 
-    shop_stats = call_sql_report(shop_status)
+    shop_stats = call_sql_report(shop_status, table_id)
     shop_columns = ['Total Orders','Total Sales','Total Discounts','Total Shipping','Total Cost','AOV','Margin','New Customers']
     df = pd.DataFrame(shop_stats, columns=shop_columns)
     shop_result = df.round(2).to_string(index=False)
@@ -551,35 +591,35 @@ def collect_data(table_id,start_date,end_date):
             SUM(CHANNEL_TRANSACTIONS) AS TOTAL_TRANSACTIONS,
             SUM(CHANNEL_REVENUE) AS TOTAL_REVENUE
         FROM
-            {table_id}_GOOGLE_ANALYTICS
+            {table_id}_DAILY_CHANNELS
         WHERE
-            DATE(CHANNEL_DATE) BETWEEN DATE('{start_date}') AND DATE('{end_date}')
+            CHANNEL_DATE BETWEEN DATE('{start_date}') AND DATE('{end_date}')
         GROUP BY
             CHANNEL_NAME
         ORDER BY
             TOTAL_SESSIONS DESC;
     """
 
-    ga_stats = call_sql_report(ga_status)
+    ga_stats = call_sql_report(ga_status, table_id)
     ga_columns = ['Channel','Total Sessions','Total Carts','Checkout Started','Total Orders','Total Revenue']
     df = pd.DataFrame(ga_stats, columns=ga_columns)
     ga_result = df.round(2).to_string(index=False)
 
     email_status = f"""
         SELECT
-            COUNT(CAMPAIGN_ID) AS TOTAL_EMAIL_CAMPAIGNS_SENT,
+            COALESCE(SUM(TOTAL_CAMPAIGNS), 0) AS TOTAL_EMAIL_CAMPAIGNS_SENT,
             SUM(DELIVERED_EMAILS) AS TOTAL_EMAILS_DELIVERED,
             (CAST(SUM(OPENS) AS FLOAT) / NULLIF(SUM(DELIVERED_EMAILS), 0)) * 100 AS OPEN_RATE,
             (CAST(SUM(CLICKS) AS FLOAT) / NULLIF(SUM(DELIVERED_EMAILS), 0)) * 100 AS CLICK_THROUGH_RATE,
             (CAST(SUM(CONVERSIONS) AS FLOAT) / NULLIF(SUM(DELIVERED_EMAILS), 0)) * 100 AS CONVERSION_RATE,
             SUM(CONVERSIONS) AS TOTAL_CONVERSIONS
         FROM
-            {table_id}_KLAVIYO_CAMPAIGNS
+            {table_id}_DAILY_EMAIL
         WHERE
-            DATE(SENT_TIME) BETWEEN DATE('{start_date}') AND DATE('{end_date}');
+            SENT_DATE BETWEEN DATE('{start_date}') AND DATE('{end_date}');
     """
 
-    email_stats = call_sql_report(email_status)
+    email_stats = call_sql_report(email_status, table_id)
     email_columns = ['Total Campaigns','Emails Delivered','Open Rate','Click Through Rate','Conversion Rate','Total Orders']
     df = pd.DataFrame(email_stats, columns=email_columns)
     email_result = df.round(2).to_string(index=False)
@@ -588,6 +628,37 @@ def collect_data(table_id,start_date,end_date):
     return results
 
 
+def rollup_report(clients, start_date, end_date):
+    """Store totals for every client side by side, for admins managing several accounts."""
+    def shop_rollup(chunk):
+        return " UNION ALL ".join(f"""
+        SELECT
+            '{table_id}' AS CLIENT,
+            COALESCE(SUM(TOTAL_ORDERS), 0) AS TOTAL_ORDERS,
+            SUM(TOTAL_SALES) AS TOTAL_SALES,
+            SUM(TOTAL_SALES) / SUM(TOTAL_ORDERS) AS AVERAGE_ORDER_VALUE
+        FROM
+            {rollup_table(table_id, 'DAILY_ORDERS')}
+        WHERE
+            ORDER_DATE BETWEEN DATE('{start_date}') AND DATE('{end_date}')
+    """ for table_id in chunk)
+
+    # Per client files are attached a group at a time, SQLite caps attached databases
+    rollup_stats = []
+    try:
+        for chunk in rollup_chunks(clients):
+            with rollup_connection(DB_PATH, chunk) as conn:
+                rollup_stats.extend(conn.execute(shop_rollup(chunk)).fetchall())
+    except Exception as e:
+        print(f"Error: {e}")
+        return "Something went wrong."
+
+    rollup_stats.sort(key=lambda row: row[2] or 0, reverse=True)
+    rollup_columns = ['Client','Total Orders','Total Sales','AOV']
+    df = pd.DataFrame(rollup_stats, columns=rollup_columns)
+    return df.round(2).to_string(index=False)
+
+
 def explain_shop(data_sets):
     today = today_date()
 
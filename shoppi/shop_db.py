@@ -0,0 +1,207 @@
+import importlib.util
+import os
+import pathlib
+import queue
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# DB_LAYOUT and DATA_VERSION_KEY come from scripts/shop_db.py, so the app reads the
+# files and version rows the syncs write. Set the layout there.
+SYNC_DB_MODULE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'shop_db.py')
+sync_spec = importlib.util.spec_from_file_location("sync_shop_db", SYNC_DB_MODULE)
+sync_shop_db = importlib.util.module_from_spec(sync_spec)
+sync_spec.loader.exec_module(sync_shop_db)
+
+DB_LAYOUT = sync_shop_db.DB_LAYOUT # "shared" (shop.db) or "per_client" ({client}.db next to it)
+DATA_VERSION_KEY = sync_shop_db.DATA_VERSION_KEY # bumped by every load
+
+# Chat queries only read. Connections are opened read-only and kept in a pool,
+# with the database in WAL mode (set by the sync scripts) they never wait on a load.
+PRAGMAS = [
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -65536",    # 64 MB page cache
+    "PRAGMA mmap_size = 268435456",  # read up to 256 MB through memory mapping
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA query_only = ON",
+]
+
+READ_POOL_SIZE = 4 # idle connections kept open per database
+
+MAX_ATTACHED = 10 # SQLite's default limit of attached databases per connection
+
+RESULT_CACHE_SIZE = 256 # query results kept by ResultCache
+
+# Quoted literals are kept as they are, whitespace between them is collapsed
+SQL_TOKENS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+")
+
+# Results that change without a load, these are never cached: 'now' in either quotes,
+# CURRENT_DATE/TIME/TIMESTAMP, date and time functions called without a time value
+# (they default to now), and random()
+VOLATILE_SQL = re.compile(
+    r"""['"]now['"]"""
+    r"|\bcurrent_(?:date|time|timestamp)\b"
+    r"|\b(?:date|time|datetime|julianday|unixepoch)\s*\(\s*\)"
+    r"""|\bstrftime\s*\(\s*(?:'(?:[^']|'')*'|"(?:[^"]|"")*")\s*\)"""
+    r"|\brandom(?:blob)?\s*\(",
+    re.IGNORECASE,
+)
+
+
+def client_db_path(table_id, db_path):
+    """Returns the database file holding the client's tables for DB_LAYOUT."""
+    if DB_LAYOUT == "per_client":
+        return os.path.join(os.path.dirname(db_path), f"{table_id.lower()}.db")
+    return db_path
+
+
+def read_only_uri(db_path):
+    return pathlib.Path(db_path).resolve().as_uri() + "?mode=ro"
+
+
+def connect_reader(db_path):
+    """Opens a read-only connection with PRAGMAS applied."""
+    conn = sqlite3.connect(read_only_uri(db_path), uri=True, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ReadPool:
+    """Hands out read-only connections to db_path, reusing up to `size` idle ones."""
+
+    def __init__(self, db_path, size=READ_POOL_SIZE):
+        self.db_path = db_path
+        self.idle = queue.Queue(maxsize=size)
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = connect_reader(self.db_path)
+
+        try:
+            yield conn
+        finally:
+            # End any read transaction so the connection does not hold back WAL checkpoints.
+            conn.rollback()
+            try:
+                self.idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+
+class ReadPools:
+    """One ReadPool per database file, so each client's file keeps its own connections."""
+
+    def __init__(self, db_path, size=READ_POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.pools = {}
+
+    def connection(self, table_id):
+        path = client_db_path(table_id, self.db_path)
+        # setdefault keeps a single pool per file when two sessions ask at once
+        pool = self.pools.get(path) or self.pools.setdefault(path, ReadPool(path, self.size))
+        return pool.connection()
+
+
+def rollup_table(client, table):
+    """Name of a client's table on a rollup_connection."""
+    if DB_LAYOUT == "per_client":
+        return f"{client}.{client}_{table}"
+    return f"{client}_{table}"
+
+
+def rollup_chunks(clients):
+    """Splits clients into groups that fit on one rollup_connection."""
+    if DB_LAYOUT != "per_client":
+        return [list(clients)]
+    return [clients[i:i + MAX_ATTACHED] for i in range(0, len(clients), MAX_ATTACHED)]
+
+
+@contextmanager
+def rollup_connection(db_path, clients):
+    """Read-only connection for reports across clients.
+
+    With per_client files every client's database is attached under the client
+    prefix, so tables are read as {client}.{client}_orders (see rollup_table).
+    SQLite attaches at most MAX_ATTACHED databases, pass groups from rollup_chunks.
+    """
+    if DB_LAYOUT != "per_client":
+        conn = connect_reader(db_path)
+    else:
+        conn = sqlite3.connect(":memory:", uri=True, check_same_thread=False)
+        for client in clients:
+            conn.execute(f"ATTACH DATABASE ? AS {client}", (read_only_uri(client_db_path(client, db_path)),))
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def normalize_sql(sql):
+    """Collapses whitespace outside quotes and drops the trailing semicolon, so reformatted queries share a cache entry."""
+    sql = SQL_TOKENS.sub(lambda m: m.group(1) or " ", sql)
+    return sql.strip().rstrip(";").strip()
+
+
+def data_version(conn, table_id):
+    row = conn.execute(f"SELECT sync_value FROM {table_id}_sync_state WHERE sync_key = ?", (DATA_VERSION_KEY,)).fetchone()
+    return row[0] if row else None
+
+
+class ResultCache:
+    """LRU cache of query results per client.
+
+    A result is reused while the client's data version is the one it was read
+    with. The loaders bump the version in the same transaction as their rows,
+    so any load makes that client's cached results miss.
+    """
+
+    def __init__(self, size=RESULT_CACHE_SIZE):
+        self.size = size
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fetchall(self, conn, table_id, sql, params=()):
+        """Returns the rows of sql, from the cache when the client's data has not changed."""
+        if VOLATILE_SQL.search(sql):
+            with self.lock:
+                self.misses += 1
+            return conn.execute(sql, params).fetchall()
+
+        key = (table_id, normalize_sql(sql), tuple(params))
+        # Version and rows are read in one transaction, so they come from the same snapshot
+        conn.execute("BEGIN")
+        version = data_version(conn, table_id)
+        with self.lock:
+            cached = self.results.get(key)
+            if cached is not None and cached[0] == version:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return list(cached[1])
+            self.misses += 1
+
+        rows = conn.execute(sql, params).fetchall()
+        with self.lock:
+            self.results[key] = (version, tuple(rows))
+            self.results.move_to_end(key)
+            while len(self.results) > self.size:
+                self.results.popitem(last=False)
+        return rows
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.results)}
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
@@ -1,10 +1,13 @@
 import streamlit as st
 from openai import OpenAI
 import os, json
-from mods import ecommerce_data, email_analytics_summary, google_analytics_summary, shop_report
+from datetime import date, timedelta
+from mods import ecommerce_data, email_analytics_summary, google_analytics_summary, shop_report, rollup_report
 
 USER_PREFIX = "" # the account prefix you want to access - example: D1
 
+ADMIN_CLIENTS = [] # account prefixes compared side by side in the sidebar, leave empty to hide it - example: ["D1","D2"]
+
 icon_path = os.path.join(os.getcwd(), "static","osgpt_favicon.png")
 
 st.set_page_config(
@@ -36,6 +39,12 @@ with st.sidebar:
         Give me a full status report for 2024.
         """
                 )
+    if ADMIN_CLIENTS:
+        st.subheader("ALL ACCOUNTS", divider="gray")
+        rollup_start = st.date_input("From", date.today() - timedelta(days=30))
+        rollup_end = st.date_input("To", date.today())
+        if st.button("Compare accounts"):
+            st.text(rollup_report(ADMIN_CLIENTS, str(rollup_start), str(rollup_end)))
     st.subheader("", divider="gray")
 
 client = OpenAI(api_key=os.environ["open_secret"],organization=os.environ["open_organization"])